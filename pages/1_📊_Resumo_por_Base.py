@@ -1,25 +1,46 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-from streamlit_app import DashboardTecnicos, load_css
+import plotly.graph_objects as go
+from streamlit_app import DashboardTecnicos, load_css, get_grupo_base, filtro_categoria, filtro_categorias, filtro_desconexao
 import warnings
 
-# Filtra os avisos específicos do pandas sobre observed
-warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
+@st.cache_resource(show_spinner=False)
+def _configurar_avisos():
+    """Filtra (uma única vez por processo) os avisos do pandas sobre observed"""
+    warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
+    return True
 
-def analise_inteligente(dados):
-    """Gera insights automáticos dos dados"""
+_configurar_avisos()
+
+# Janela dos "últimos 30 dias" em nanossegundos
+JANELA_RECENTE_NS = np.timedelta64(30, 'D').astype('timedelta64[ns]').astype(np.int64)
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def analise_inteligente(_dados, _prod_por_base, nome_arquivo, mtime, grupo, base, status):
+    """
+    Gera insights automáticos dos dados filtrados (reaproveita a agregação por
+    BASE, se fornecida), uma vez por combinação (arquivo, grupo, base, status)
+    """
     insights = []
     
+    prod_por_base = _prod_por_base
+    if prod_por_base is None:
+        prod_por_base = agregar_por_base(_dados)
+    
     # Verifica se a coluna GRUPO existe
-    if 'GRUPO' in dados.columns:
-        # Análise por Grupo
-        prod_por_grupo = dados.groupby('GRUPO', observed=True).agg({
-            'CONTRATO': 'count',
-            'TECNICO': 'nunique',
-            'VALOR EMPRESA': 'sum'
-        })
+    if 'GRUPO' in _dados.columns:
+        # Análise por Grupo: contratos e valor são somados a partir da agregação
+        # por BASE (cada base pertence a um único grupo); só o nunique de
+        # técnicos precisa percorrer as linhas novamente
+        prod_por_grupo = prod_por_base[['CONTRATO', 'VALOR EMPRESA']].groupby(
+            prod_por_base.index.map(get_grupo_base)
+        ).sum()
+        if len(prod_por_grupo) == 1:
+            # Um único grupo: contagem direta, sem groupby
+            prod_por_grupo['TECNICO'] = _dados['TECNICO'].nunique()
+        else:
+            prod_por_grupo['TECNICO'] = _dados.groupby('GRUPO', observed=True)['TECNICO'].nunique()
         
         # Produtividade por grupo
         prod_por_tecnico_grupo = prod_por_grupo['CONTRATO'] / prod_por_grupo['TECNICO']
@@ -28,19 +49,14 @@ def analise_inteligente(dados):
         insights.append(f"📊 O grupo mais produtivo é **{melhor_grupo}** com média de "
                        f"**{prod_por_tecnico_grupo[melhor_grupo]:.1f}** contratos por técnico")
         
-        # Distribuição por grupo
-        for grupo in prod_por_grupo.index:
-            total_grupo = prod_por_grupo.loc[grupo, 'CONTRATO']
-            perc_grupo = (total_grupo / dados['CONTRATO'].count()) * 100
-            insights.append(f"📌 Grupo **{grupo}**: representa **{perc_grupo:.1f}%** dos contratos")
+        # Distribuição por grupo (categorias sem linhas ficam de fora)
+        perc_por_grupo = _dados['GRUPO'].value_counts(normalize=True) * 100
+        insights.extend([
+            f"📌 Grupo **{grupo}**: representa **{perc_grupo:.1f}%** dos contratos"
+            for grupo, perc_grupo in perc_por_grupo[perc_por_grupo > 0].items()
+        ])
     
     # 1. Análise de Produtividade
-    prod_por_base = dados.groupby('BASE', observed=True).agg({
-        'CONTRATO': 'count',
-        'TECNICO': 'nunique',
-        'VALOR EMPRESA': 'sum'
-    })
-    
     # Identifica bases mais produtivas
     prod_por_tecnico = prod_por_base['CONTRATO'] / prod_por_base['TECNICO']
     melhor_base = prod_por_tecnico.idxmax()
@@ -64,20 +80,64 @@ def analise_inteligente(dados):
                    f"produtividade ({media_contratos:.1f} contratos/técnico)")
     
     # 4. Análise de Desconexões
-    desconexoes = dados[dados['TIPO DE SERVIÇO'].str.contains('DESCONEX', case=False, na=False)]
-    taxa_desconexao = len(desconexoes) / len(dados) * 100
+    mask_desconexao = filtro_desconexao(_dados['TIPO DE SERVIÇO'])
+    taxa_desconexao = mask_desconexao.mean() * 100
     
     insights.append(f"📉 Taxa de desconexão geral: **{taxa_desconexao:.1f}%** dos contratos")
     
     # 5. Análise de Tendências
-    if 'DATA_TOA' in dados.columns:
-        dados_recentes = dados[dados['DATA_TOA'] >= dados['DATA_TOA'].max() - pd.Timedelta(days=30)]
-        bases_crescimento = dados_recentes.groupby('BASE')['CONTRATO'].count().sort_values(ascending=False)
+    if 'DATA_TOA' in _dados.columns and len(_dados) > 0:
+        # Compara os timestamps como int64 (ns); NaT vira o menor int64 e fica de fora
+        datas_ns = _dados['DATA_TOA'].to_numpy(dtype='datetime64[ns]').view('i8')
+        corte = datas_ns.max() - JANELA_RECENTE_NS
+        bases_crescimento = _dados['BASE'][datas_ns >= corte].value_counts()
+        bases_crescimento = bases_crescimento[bases_crescimento > 0]
         
         insights.append(f"📈 Bases com maior volume recente: **{', '.join(bases_crescimento.head(3).index)}**")
     
     return insights
 
+def somar_por_grupo(codigos, valores, n_grupos):
+    """Soma `valores` por código de grupo com np.add.reduceat sobre os códigos ordenados"""
+    somas = np.zeros(n_grupos, dtype=np.float64)
+    if codigos.size == 0:
+        return somas
+    ordem = np.argsort(codigos, kind='stable')
+    codigos_ordenados = codigos[ordem]
+    inicios = np.concatenate(([0], np.flatnonzero(np.diff(codigos_ordenados)) + 1))
+    somas[codigos_ordenados[inicios]] = np.add.reduceat(
+        valores[ordem].astype(np.float64), inicios
+    )
+    return somas
+
+def agregar_por_base(dados):
+    """Agrega contratos, técnicos e valor por BASE a partir dos códigos das categorias"""
+    # BASE e TECNICO chegam como category sem nulos (preenchidos no carregamento)
+    bases = dados['BASE'].cat.categories
+    cod_base = dados['BASE'].cat.codes.to_numpy().astype(np.intp)
+    cod_tecnico = dados['TECNICO'].cat.codes.to_numpy().astype(np.intp)
+    n_tecnicos = max(len(dados['TECNICO'].cat.categories), 1)
+    
+    # count(CONTRATO): ocorrências de cada código de BASE
+    contratos = np.bincount(cod_base, minlength=len(bases))
+    
+    # nunique(TECNICO): pares (base, técnico) distintos contados por base
+    pares = np.unique(cod_base * n_tecnicos + cod_tecnico)
+    tecnicos = np.bincount(pares // n_tecnicos, minlength=len(bases))
+    
+    # sum(VALOR EMPRESA) por BASE
+    valores = somar_por_grupo(cod_base, dados['VALOR EMPRESA'].to_numpy(), len(bases))
+    
+    observadas = contratos > 0
+    return pd.DataFrame(
+        {
+            'CONTRATO': contratos[observadas],
+            'TECNICO': tecnicos[observadas],
+            'VALOR EMPRESA': valores[observadas]
+        },
+        index=pd.Index(bases[observadas], name='BASE')
+    )
+
 def main():
     st.set_page_config(
         page_title="Resumo por Base",
@@ -130,8 +190,11 @@ def main():
             st.write("### Filtros")
             col1, col2, col3 = st.columns(3)
             
+            # Listas dos filtros pré-calculadas no carregamento do arquivo
+            opcoes = dashboard.opcoes_filtro
+            
             with col1:
-                grupos_disponiveis = ['Todos'] + sorted(dashboard.dados['GRUPO'].unique().tolist())
+                grupos_disponiveis = ['Todos'] + opcoes['grupos']
                 grupo_selecionado = st.selectbox(
                     "Selecione o Grupo:",
                     grupos_disponiveis,
@@ -140,11 +203,11 @@ def main():
                 
                 # Filtra as bases baseado no grupo selecionado
                 if grupo_selecionado != 'Todos':
-                    bases_filtradas = dashboard.dados[dashboard.dados['GRUPO'] == grupo_selecionado]['BASE'].unique()
+                    bases_filtradas = opcoes['bases_por_grupo'].get(grupo_selecionado, [])
                 else:
-                    bases_filtradas = dashboard.dados['BASE'].unique()
+                    bases_filtradas = opcoes['bases']
                 
-                bases_disponiveis = ['Todas'] + sorted(bases_filtradas.tolist())
+                bases_disponiveis = ['Todas'] + bases_filtradas
                 base_selecionada = st.selectbox(
                     "Selecione a Base:",
                     bases_disponiveis,
@@ -152,7 +215,7 @@ def main():
                 )
             
             with col2:
-                status_disponiveis = sorted(dashboard.dados['STATUS'].dropna().unique().tolist())
+                status_disponiveis = opcoes['status']
                 status_selecionados = st.multiselect(
                     "Selecione os Status:",
                     status_disponiveis,
@@ -160,26 +223,52 @@ def main():
                     key='status_selector_resumo'
                 )
             
-            # Aplica os filtros
-            dados_filtrados = dashboard.dados.copy()
+            # Aplica os filtros com uma única máscara (sem copiar o DataFrame):
+            # igualdades nos códigos das categorias primeiro, o isin por último
+            mask = np.ones(len(dashboard.dados), dtype=bool)
             
             if grupo_selecionado != 'Todos':
-                dados_filtrados = dados_filtrados[dados_filtrados['GRUPO'] == grupo_selecionado]
+                mask &= filtro_categoria(dashboard.dados['GRUPO'], grupo_selecionado)
             
             if base_selecionada != 'Todas':
-                dados_filtrados = dados_filtrados[dados_filtrados['BASE'] == base_selecionada]
+                mask &= filtro_categoria(dashboard.dados['BASE'], base_selecionada)
+            
+            # Com todos os status selecionados (padrão) o filtro não muda nada
+            if status_selecionados and set(status_selecionados) != set(status_disponiveis):
+                mask &= filtro_categorias(dashboard.dados['STATUS'], status_selecionados)
             
-            if status_selecionados:
-                dados_filtrados = dados_filtrados[dados_filtrados['STATUS'].isin(status_selecionados)]
+            dados_filtrados = dashboard.dados[mask]
             
-            # Mostra as tabelas com os dados filtrados
-            dashboard.mostrar_tabela_bases(dados_filtrados)
+            # Totais e agregação por BASE calculados uma única vez e
+            # compartilhados entre tabelas, métricas, insights e gráficos
+            total_registros = len(dados_filtrados)
+            total_tecnicos = dados_filtrados['TECNICO'].nunique()
+            valor_total = dados_filtrados['VALOR EMPRESA'].sum()
+            
+            if base_selecionada != 'Todas':
+                # Uma única base: reaproveita os totais já calculados, sem groupby
+                agg_base = pd.DataFrame(
+                    {
+                        'CONTRATO': [total_registros],
+                        'TECNICO': [total_tecnicos],
+                        'VALOR EMPRESA': [valor_total]
+                    },
+                    index=pd.Index([base_selecionada], name='BASE')
+                )
+            else:
+                agg_base = agregar_por_base(dados_filtrados)
+            
+            # Mostra as tabelas com os dados filtrados (com uma única base, a
+            # tabela agrupa as poucas linhas dela e mantém a soma do groupby)
+            dashboard.mostrar_tabela_bases(
+                dados_filtrados,
+                agregado_base=agg_base if base_selecionada == 'Todas' else None
+            )
             
             # Adiciona métricas dinâmicas
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_registros = len(dados_filtrados)
                 st.metric(
                     "Total de Registros",
                     f"{total_registros:,}",
@@ -187,7 +276,6 @@ def main():
                 )
             
             with col2:
-                total_tecnicos = dados_filtrados['TECNICO'].nunique()
                 st.metric(
                     "Total de Técnicos",
                     f"{total_tecnicos:,}",
@@ -195,7 +283,6 @@ def main():
                 )
             
             with col3:
-                valor_total = dados_filtrados['VALOR EMPRESA'].sum()
                 st.metric(
                     "Valor Total",
                     f"R$ {valor_total:,.2f}",
@@ -222,7 +309,11 @@ def main():
             # Continua com as análises...
             with st.spinner("Gerando insights..."):
                 try:
-                    insights = analise_inteligente(dados_filtrados)
+                    # Cache por (arquivo, mtime, filtros), como nas demais páginas
+                    insights = analise_inteligente(
+                        dados_filtrados, agg_base, arquivo, dashboard.mtime,
+                        grupo_selecionado, base_selecionada, tuple(status_selecionados)
+                    )
                     cols = st.columns(2)
                     for i, insight in enumerate(insights):
                         with cols[i % 2]:
@@ -233,27 +324,41 @@ def main():
             # Adiciona análises comparativas
             st.write("## 📊 Análises Comparativas")
             
+            # Remove bases sem técnicos para evitar divisão por zero
+            com_tecnicos = agg_base[agg_base['TECNICO'] > 0]
+            bases_comparativas = com_tecnicos.index.to_numpy()
+            eficiencia = (com_tecnicos['CONTRATO'] / com_tecnicos['TECNICO']).to_numpy()
+            rentabilidade = (com_tecnicos['VALOR EMPRESA'] / com_tecnicos['TECNICO']).to_numpy()
+            
             col1, col2 = st.columns(2)
             
+            if base_selecionada != 'Todas':
+                # Com uma única base o gráfico de barras não compara nada
+                if len(bases_comparativas) > 0:
+                    with col1:
+                        st.metric(
+                            "Eficiência (Contratos/Técnico)",
+                            f"{eficiencia[0]:.1f}"
+                        )
+                    with col2:
+                        st.metric(
+                            "Rentabilidade (R$/Técnico)",
+                            f"R$ {rentabilidade[0]:,.2f}"
+                        )
+                else:
+                    st.warning("Não há dados suficientes para a análise comparativa")
+                return
+            
             with col1:
                 # Gráfico de Eficiência
-                dados_eficiencia = dados_filtrados.groupby('BASE', observed=True).agg({
-                    'CONTRATO': 'count',
-                    'TECNICO': 'nunique'
-                }).reset_index()
-                
-                # Remove bases sem técnicos para evitar divisão por zero
-                dados_eficiencia = dados_eficiencia[dados_eficiencia['TECNICO'] > 0]
-                dados_eficiencia['Eficiência'] = dados_eficiencia['CONTRATO'] / dados_eficiencia['TECNICO']
-                
-                if not dados_eficiencia.empty:
-                    media_geral = dados_eficiencia['Eficiência'].mean()
+                if len(bases_comparativas) > 0:
+                    media_geral = eficiencia.mean()
                     
-                    fig = px.bar(
-                        dados_eficiencia,
-                        x='BASE',
-                        y='Eficiência',
-                        title='Eficiência por Base (Contratos/Técnico)'
+                    fig = go.Figure(go.Bar(x=bases_comparativas, y=eficiencia))
+                    fig.update_layout(
+                        title='Eficiência por Base (Contratos/Técnico)',
+                        xaxis_title='BASE',
+                        yaxis_title='Eficiência'
                     )
                     
                     fig.add_hline(
@@ -269,21 +374,12 @@ def main():
             
             with col2:
                 # Gráfico de Rentabilidade
-                dados_rent = dados_filtrados.groupby('BASE', observed=True).agg({
-                    'VALOR EMPRESA': 'sum',
-                    'TECNICO': 'nunique'
-                }).reset_index()
-                
-                # Remove bases sem técnicos
-                dados_rent = dados_rent[dados_rent['TECNICO'] > 0]
-                dados_rent['Rentabilidade'] = dados_rent['VALOR EMPRESA'] / dados_rent['TECNICO']
-                
-                if not dados_rent.empty:
-                    fig = px.bar(
-                        dados_rent,
-                        x='BASE',
-                        y='Rentabilidade',
-                        title='Rentabilidade por Base (R$/Técnico)'
+                if len(bases_comparativas) > 0:
+                    fig = go.Figure(go.Bar(x=bases_comparativas, y=rentabilidade))
+                    fig.update_layout(
+                        title='Rentabilidade por Base (R$/Técnico)',
+                        xaxis_title='BASE',
+                        yaxis_title='Rentabilidade'
                     )
                     
                     st.plotly_chart(fig)
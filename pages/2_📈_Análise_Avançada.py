@@ -3,373 +3,334 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from streamlit_app import DashboardTecnicos, load_css
+import plotly.io as pio
+from streamlit_app import (
+    DashboardTecnicos, load_css, calcular_tempo_minutos, estimar_tempo_minutos, extrair_hora,
+    filtro_categoria, converter_valor_monetario, COLUNAS_CATEGORICAS, ORDEM_DIAS
+)
 from datetime import datetime, timedelta, date
 import warnings
 
 # Filtra os avisos específicos do pandas sobre observed
 warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
 
-def analisar_tempo_execucao(dados):
+# VALOR EMPRESA fica em centavos (int32) nos dados preparados
+CENTAVOS = 100
+
+# Formatação das tabelas feita pelo st.dataframe: colunas continuam numéricas
+# (ordenáveis) e nenhuma string é montada linha a linha no Python
+FORMATO_REAIS = st.column_config.NumberColumn(format='R$ %.2f')
+FORMATO_PERCENTUAL = st.column_config.NumberColumn(format='%.1f%%')
+FORMATO_MINUTOS = st.column_config.NumberColumn(format='%.1f min')
+
+def figuras_tempo_execucao(tempo_servico, histograma_tempo, tempo_medio):
+    """Gráficos de tempo médio por tipo de serviço e distribuição do tempo"""
+    # Tempo médio por tipo de serviço
+    fig_tipo = px.bar(
+        tempo_servico,
+        x='TIPO DE SERVIÇO',
+        y='TEMPO_MEDIO',
+        title='Tempo Médio por Tipo de Serviço (minutos)',
+        labels={
+            'TIPO DE SERVIÇO': 'Tipo de Serviço',
+            'TEMPO_MEDIO': 'Tempo Médio (min)',
+        },
+        text='QUANTIDADE'
+    )
+    
+    fig_tipo.update_traces(
+        texttemplate='%{text} serviços',
+        textposition='outside'
+    )
+    
+    # Distribuição de tempo (faixas já calculadas no servidor)
+    contagens, bordas = histograma_tempo
+    fig_distribuicao = go.Figure(go.Bar(
+        x=(bordas[:-1] + bordas[1:]) / 2,
+        y=contagens,
+        width=np.diff(bordas)
+    ))
+    fig_distribuicao.update_layout(
+        title='Distribuição do Tempo de Execução',
+        xaxis_title='Tempo (minutos)',
+        yaxis_title='Quantidade',
+        bargap=0
+    )
+    
+    # Adiciona linha vertical com a média
+    fig_distribuicao.add_vline(
+        x=tempo_medio,
+        line_dash="dash",
+        line_color="red",
+        annotation_text=f"Média: {tempo_medio:.1f} min"
+    )
+    
+    return fig_tipo, fig_distribuicao
+
+def analisar_tempo_execucao(figuras):
     st.subheader("⏱️ Análise de Tempo de Execução")
     
+    fig_tipo, fig_distribuicao = figuras
     col1, col2 = st.columns(2)
     
     with col1:
-        # Tempo médio por tipo de serviço
-        tempo_servico = dados.groupby('TIPO DE SERVIÇO', observed=True).agg({
-            'TEMPO_MINUTOS': ['mean', 'count']
-        }).round(2)
-        
-        # Reseta o índice e ajusta os nomes das colunas
-        tempo_servico = tempo_servico.reset_index()
-        tempo_servico.columns = ['TIPO DE SERVIÇO', 'TEMPO_MEDIO', 'QUANTIDADE']
-        
-        fig = px.bar(
-            tempo_servico,
-            x='TIPO DE SERVIÇO',
-            y='TEMPO_MEDIO',
-            title='Tempo Médio por Tipo de Serviço (minutos)',
-            labels={
-                'TIPO DE SERVIÇO': 'Tipo de Serviço',
-                'TEMPO_MEDIO': 'Tempo Médio (min)',
-            },
-            text='QUANTIDADE'
-        )
-        
-        fig.update_traces(
-            texttemplate='%{text} serviços',
-            textposition='outside'
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_tipo, use_container_width=True)
     
     with col2:
-        # Distribuição de tempo
-        fig = px.histogram(
-            dados,
-            x='TEMPO_MINUTOS',
-            title='Distribuição do Tempo de Execução',
-            nbins=30,
-            labels={
-                'TEMPO_MINUTOS': 'Tempo (minutos)',
-                'count': 'Quantidade'
-            }
-        )
-        
-        # Adiciona linha vertical com a média
-        fig.add_vline(
-            x=dados['TEMPO_MINUTOS'].mean(),
-            line_dash="dash",
-            line_color="red",
-            annotation_text=f"Média: {dados['TEMPO_MINUTOS'].mean():.1f} min"
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_distribuicao, use_container_width=True)
 
-def analisar_produtividade_regional(dados):
-    st.subheader("🗺️ Análise Regional por Base")
+def figuras_produtividade_regional(prod_regional):
+    """Gráficos de produtividade e distribuição de valor por base"""
+    # Gráfico de barras para contratos por técnico
+    fig_produtividade = px.bar(
+        prod_regional,
+        x='BASE',
+        y='CONTRATOS_POR_TECNICO',
+        title='Produtividade por Base',
+        labels={
+            'BASE': 'Base',
+            'CONTRATOS_POR_TECNICO': 'Contratos por Técnico'
+        },
+        text='CONTRATOS_POR_TECNICO'
+    )
     
-    # Agrupa por BASE
-    prod_regional = dados.groupby('BASE', observed=True).agg({
-        'CONTRATO': 'count',
-        'VALOR EMPRESA': 'sum',
-        'TECNICO': 'nunique'
-    }).reset_index()
+    fig_produtividade.update_traces(
+        texttemplate='%{text:.1f}',
+        textposition='outside'
+    )
     
-    # Calcula métricas
-    prod_regional['CONTRATOS_POR_TECNICO'] = (prod_regional['CONTRATO'] / 
-                                             prod_regional['TECNICO']).round(2)
-    prod_regional['VALOR_MEDIO_CONTRATO'] = (prod_regional['VALOR EMPRESA'] / 
-                                            prod_regional['CONTRATO']).round(2)
+    # Gráfico de pizza para distribuição de valor
+    fig_valor = px.pie(
+        prod_regional,
+        values='VALOR EMPRESA',
+        names='BASE',
+        title='Distribuição de Valor por Base',
+        hover_data=['CONTRATOS_POR_TECNICO', 'VALOR_MEDIO_CONTRATO']
+    )
+    
+    return fig_produtividade, fig_valor
+
+def analisar_produtividade_regional(figuras, prod_regional):
+    st.subheader("🗺️ Análise Regional por Base")
     
     # Visualizações
+    fig_produtividade, fig_valor = figuras
     col1, col2 = st.columns(2)
     
     with col1:
-        # Gráfico de barras para contratos por técnico
-        fig = px.bar(
-            prod_regional,
-            x='BASE',
-            y='CONTRATOS_POR_TECNICO',
-            title='Produtividade por Base',
-            labels={
-                'BASE': 'Base',
-                'CONTRATOS_POR_TECNICO': 'Contratos por Técnico'
-            },
-            text='CONTRATOS_POR_TECNICO'
-        )
-        
-        fig.update_traces(
-            texttemplate='%{text:.1f}',
-            textposition='outside'
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_produtividade, use_container_width=True)
     
     with col2:
-        # Gráfico de pizza para distribuição de valor
-        fig = px.pie(
-            prod_regional,
-            values='VALOR EMPRESA',
-            names='BASE',
-            title='Distribuição de Valor por Base',
-            hover_data=['CONTRATOS_POR_TECNICO', 'VALOR_MEDIO_CONTRATO']
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_valor, use_container_width=True)
     
     # Tabela resumo
     st.write("### Resumo por Base")
     
     # Formata a tabela
-    tabela_resumo = prod_regional.copy()
-    tabela_resumo['VALOR EMPRESA'] = tabela_resumo['VALOR EMPRESA'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['VALOR_MEDIO_CONTRATO'] = tabela_resumo['VALOR_MEDIO_CONTRATO'].apply(lambda x: f"R$ {x:,.2f}")
-    
-    tabela_resumo.columns = [
+    tabela_resumo = prod_regional.set_axis([
         'Base',
         'Total Contratos',
         'Valor Total',
         'Total Técnicos',
         'Contratos/Técnico',
         'Valor Médio/Contrato'
-    ]
+    ], axis=1)
     
     st.dataframe(
         tabela_resumo,
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'Valor Total': FORMATO_REAIS,
+            'Valor Médio/Contrato': FORMATO_REAIS
+        }
     )
 
-def analisar_tipo_servico(dados):
-    st.subheader("🔧 Análise por Tipo de Serviço")
+def figuras_tipo_servico(tipo_servico):
+    """Gráficos de distribuição e valor médio por tipo de serviço"""
+    # Gráfico de pizza para distribuição de contratos
+    fig_distribuicao = px.pie(
+        tipo_servico,
+        values='TOTAL_CONTRATOS',
+        names='TIPO DE SERVIÇO',
+        title='Distribuição por Tipo de Serviço',
+        hover_data=['VALOR_MEDIO']
+    )
     
-    tipo_servico = dados.groupby('TIPO DE SERVIÇO', observed=True).agg({
-        'CONTRATO': 'count',
-        'VALOR EMPRESA': ['sum', 'mean'],
-        'TEMPO_MINUTOS': 'mean'
-    }).round(2)
-    
-    # Reseta o índice e ajusta os nomes das colunas
-    tipo_servico = tipo_servico.reset_index()
-    tipo_servico.columns = [
-        'TIPO DE SERVIÇO',
-        'TOTAL_CONTRATOS',
-        'VALOR_TOTAL',
-        'VALOR_MEDIO',
-        'TEMPO_MEDIO'
-    ]
+    # Gráfico de barras para valor médio
+    fig_valor = px.bar(
+        tipo_servico,
+        x='TIPO DE SERVIÇO',
+        y='VALOR_MEDIO',
+        title='Valor Médio por Tipo de Serviço',
+        text='TOTAL_CONTRATOS'
+    )
+    
+    fig_valor.update_traces(
+        texttemplate='%{text} contratos',
+        textposition='outside'
+    )
+    
+    return fig_distribuicao, fig_valor
+
+def analisar_tipo_servico(figuras, tipo_servico):
+    st.subheader("🔧 Análise por Tipo de Serviço")
     
+    fig_distribuicao, fig_valor = figuras
     col1, col2 = st.columns(2)
     
     with col1:
-        # Gráfico de pizza para distribuição de contratos
-        fig = px.pie(
-            tipo_servico,
-            values='TOTAL_CONTRATOS',
-            names='TIPO DE SERVIÇO',
-            title='Distribuição por Tipo de Serviço',
-            hover_data=['VALOR_MEDIO']
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_distribuicao, use_container_width=True)
     
     with col2:
-        # Gráfico de barras para valor médio
-        fig = px.bar(
-            tipo_servico,
-            x='TIPO DE SERVIÇO',
-            y='VALOR_MEDIO',
-            title='Valor Médio por Tipo de Serviço',
-            text='TOTAL_CONTRATOS'
-        )
-        
-        fig.update_traces(
-            texttemplate='%{text} contratos',
-            textposition='outside'
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_valor, use_container_width=True)
     
     # Tabela resumo
     st.write("### Resumo por Tipo de Serviço")
     
     # Formata a tabela
-    tabela_resumo = tipo_servico.copy()
-    tabela_resumo['VALOR_TOTAL'] = tabela_resumo['VALOR_TOTAL'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['VALOR_MEDIO'] = tabela_resumo['VALOR_MEDIO'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['TEMPO_MEDIO'] = tabela_resumo['TEMPO_MEDIO'].apply(lambda x: f"{x:.1f} min")
-    
-    tabela_resumo.columns = [
+    tabela_resumo = tipo_servico[[
+        'TIPO DE SERVIÇO', 'TOTAL_CONTRATOS', 'VALOR_TOTAL', 'VALOR_MEDIO', 'TEMPO_MEDIO'
+    ]].set_axis([
         'Tipo de Serviço',
         'Total Contratos',
         'Valor Total',
         'Valor Médio',
         'Tempo Médio'
-    ]
+    ], axis=1)
     
     st.dataframe(
         tabela_resumo,
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'Valor Total': FORMATO_REAIS,
+            'Valor Médio': FORMATO_REAIS,
+            'Tempo Médio': FORMATO_MINUTOS
+        }
     )
 
-def analisar_horarios(dados):
-    st.subheader("🕒 Análise por Período")
+def figuras_horarios(prod_horario, prod_dia):
+    """Gráficos de serviços por hora do dia e por dia da semana"""
+    # Análise por hora do dia
+    fig_hora = px.bar(
+        prod_horario,
+        x='HORA',
+        y='CONTRATO',
+        title='Distribuição de Serviços por Hora',
+        labels={
+            'HORA': 'Hora do Dia',
+            'CONTRATO': 'Quantidade de Serviços'
+        },
+        text='CONTRATO'
+    )
+    
+    fig_hora.update_traces(
+        texttemplate='%{text}',
+        textposition='outside'
+    )
+    
+    # Análise por dia da semana
+    fig_dia = px.bar(
+        prod_dia,
+        x='DIA_SEMANA',
+        y='CONTRATO',
+        title='Distribuição de Serviços por Dia da Semana',
+        labels={
+            'DIA_SEMANA': 'Dia da Semana',
+            'CONTRATO': 'Quantidade de Serviços'
+        },
+        text='CONTRATO'
+    )
+    
+    fig_dia.update_traces(
+        texttemplate='%{text}',
+        textposition='outside'
+    )
     
-    # Usa a hora da DATA_TOA
-    dados['HORA'] = dados['DATA_TOA'].dt.hour
+    return fig_hora, fig_dia
+
+def analisar_horarios(figuras, prod_horario):
+    st.subheader("🕒 Análise por Período")
     
+    fig_hora, fig_dia = figuras
     col1, col2 = st.columns(2)
     
     with col1:
-        # Análise por hora do dia
-        prod_horario = dados.groupby('HORA', observed=True).agg({
-            'CONTRATO': 'count',
-            'VALOR EMPRESA': 'sum',
-            'STATUS': lambda x: (x == 'Executado').mean() * 100
-        }).reset_index()
-        
-        fig = px.bar(
-            prod_horario,
-            x='HORA',
-            y='CONTRATO',
-            title='Distribuição de Serviços por Hora',
-            labels={
-                'HORA': 'Hora do Dia',
-                'CONTRATO': 'Quantidade de Serviços'
-            },
-            text='CONTRATO'
-        )
-        
-        fig.update_traces(
-            texttemplate='%{text}',
-            textposition='outside'
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_hora, use_container_width=True)
     
     with col2:
-        # Análise por dia da semana
-        prod_dia = dados.groupby('DIA_SEMANA', observed=True).agg({
-            'CONTRATO': 'count',
-            'VALOR EMPRESA': 'mean',
-            'STATUS': lambda x: (x == 'Executado').mean() * 100
-        }).reset_index()
-        
-        # Ordena os dias da semana
-        ordem_dias = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        prod_dia['DIA_SEMANA'] = pd.Categorical(prod_dia['DIA_SEMANA'], categories=ordem_dias, ordered=True)
-        prod_dia = prod_dia.sort_values('DIA_SEMANA')
-        
-        fig = px.bar(
-            prod_dia,
-            x='DIA_SEMANA',
-            y='CONTRATO',
-            title='Distribuição de Serviços por Dia da Semana',
-            labels={
-                'DIA_SEMANA': 'Dia da Semana',
-                'CONTRATO': 'Quantidade de Serviços'
-            },
-            text='CONTRATO'
-        )
-        
-        fig.update_traces(
-            texttemplate='%{text}',
-            textposition='outside'
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_dia, use_container_width=True)
     
     # Tabela resumo
     st.write("### Resumo por Período")
     
     # Prepara dados para a tabela
-    tabela_resumo = prod_horario.copy()
-    tabela_resumo['VALOR EMPRESA'] = tabela_resumo['VALOR EMPRESA'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['STATUS'] = tabela_resumo['STATUS'].apply(lambda x: f"{x:.1f}%")
-    
-    tabela_resumo.columns = [
+    tabela_resumo = prod_horario.set_axis([
         'Hora',
         'Total Serviços',
         'Valor Total',
         'Taxa de Sucesso'
-    ]
+    ], axis=1)
     
     st.dataframe(
         tabela_resumo,
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'Valor Total': FORMATO_REAIS,
+            'Taxa de Sucesso': FORMATO_PERCENTUAL
+        }
     )
 
-def analisar_eficiencia_tecnicos(dados):
-    st.subheader("👨‍🔧 Análise de Eficiência dos Técnicos")
+def figuras_eficiencia_tecnicos(eficiencia):
+    """Gráficos dos 10 técnicos com maior volume e maior taxa de sucesso"""
+    # Gráfico de barras para total de contratos: top 10 por seleção parcial
+    # (nlargest, sem ordenar todos os técnicos), invertido para o maior ficar no topo
+    fig_volume = px.bar(
+        eficiencia.nlargest(10, 'TOTAL_CONTRATOS').iloc[::-1],
+        x='TOTAL_CONTRATOS',
+        y='TECNICO',
+        orientation='h',
+        title='Top 10 Técnicos por Volume',
+        labels={
+            'TOTAL_CONTRATOS': 'Total de Contratos',
+            'TECNICO': 'Técnico'
+        }
+    )
     
-    # Calcula métricas por técnico (adicionado observed=True)
-    eficiencia = dados.groupby('TECNICO', observed=True).agg({
-        'CONTRATO': 'count',
-        'VALOR EMPRESA': ['sum', 'mean'],
-        'TEMPO_MINUTOS': 'mean',
-        'STATUS': lambda x: (x == 'Executado').mean() * 100
-    }).round(2)
-    
-    # Ajusta os nomes das colunas
-    eficiencia.columns = [
-        'TOTAL_CONTRATOS',
-        'VALOR_TOTAL',
-        'VALOR_MEDIO',
-        'TEMPO_MEDIO',
-        'TAXA_SUCESSO'
-    ]
-    eficiencia = eficiencia.reset_index()
-    
-    # Calcula produtividade
-    eficiencia['PRODUTIVIDADE'] = (eficiencia['TOTAL_CONTRATOS'] * 
-                                  eficiencia['TAXA_SUCESSO'] / 100).round(2)
+    # Gráfico de barras para taxa de sucesso
+    fig_sucesso = px.bar(
+        eficiencia.nlargest(10, 'TAXA_SUCESSO').iloc[::-1],
+        x='TAXA_SUCESSO',
+        y='TECNICO',
+        orientation='h',
+        title='Top 10 Técnicos por Taxa de Sucesso',
+        labels={
+            'TAXA_SUCESSO': 'Taxa de Sucesso (%)',
+            'TECNICO': 'Técnico'
+        }
+    )
+    
+    return fig_volume, fig_sucesso
+
+def analisar_eficiencia_tecnicos(figuras, eficiencia):
+    st.subheader("👨‍🔧 Análise de Eficiência dos Técnicos")
     
+    fig_volume, fig_sucesso = figuras
     col1, col2 = st.columns(2)
     
     with col1:
-        # Gráfico de barras para total de contratos
-        fig = px.bar(
-            eficiencia.sort_values('TOTAL_CONTRATOS', ascending=True).tail(10),
-            x='TOTAL_CONTRATOS',
-            y='TECNICO',
-            orientation='h',
-            title='Top 10 Técnicos por Volume',
-            labels={
-                'TOTAL_CONTRATOS': 'Total de Contratos',
-                'TECNICO': 'Técnico'
-            }
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_volume, use_container_width=True)
     
     with col2:
-        # Gráfico de barras para taxa de sucesso
-        fig = px.bar(
-            eficiencia.sort_values('TAXA_SUCESSO', ascending=True).tail(10),
-            x='TAXA_SUCESSO',
-            y='TECNICO',
-            orientation='h',
-            title='Top 10 Técnicos por Taxa de Sucesso',
-            labels={
-                'TAXA_SUCESSO': 'Taxa de Sucesso (%)',
-                'TECNICO': 'Técnico'
-            }
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(fig_sucesso, use_container_width=True)
     
     # Tabela resumo
     st.write("### Resumo por Técnico")
     
     # Formata a tabela
-    tabela_resumo = eficiencia.copy()
-    tabela_resumo['VALOR_TOTAL'] = tabela_resumo['VALOR_TOTAL'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['VALOR_MEDIO'] = tabela_resumo['VALOR_MEDIO'].apply(lambda x: f"R$ {x:,.2f}")
-    tabela_resumo['TAXA_SUCESSO'] = tabela_resumo['TAXA_SUCESSO'].apply(lambda x: f"{x:.1f}%")
-    tabela_resumo['TEMPO_MEDIO'] = tabela_resumo['TEMPO_MEDIO'].apply(lambda x: f"{x:.1f} min")
-    
-    tabela_resumo.columns = [
+    tabela_resumo = eficiencia.set_axis([
         'Técnico',
         'Total Contratos',
         'Valor Total',
@@ -377,56 +338,76 @@ def analisar_eficiencia_tecnicos(dados):
         'Tempo Médio',
         'Taxa de Sucesso',
         'Produtividade'
-    ]
+    ], axis=1)
     
     st.dataframe(
         tabela_resumo.sort_values('Total Contratos', ascending=False),
         use_container_width=True,
-        hide_index=True
+        hide_index=True,
+        column_config={
+            'Valor Total': FORMATO_REAIS,
+            'Valor Médio': FORMATO_REAIS,
+            'Tempo Médio': FORMATO_MINUTOS,
+            'Taxa de Sucesso': FORMATO_PERCENTUAL
+        }
     )
 
 def preparar_dados(dados):
     """Prepara os dados para análise, criando colunas calculadas"""
     try:
-        dados = dados.copy()
+        dados = dados.copy(deep=False)  # Copy-on-write: colunas novas não alteram o original
         
         # Converte datas
         if 'DATA_TOA' in dados.columns:
             dados['DATA_TOA'] = pd.to_datetime(dados['DATA_TOA'])
         
-        # Garante que valores monetários sejam numéricos
+        # Garante categorias nas colunas de texto usadas nos agrupamentos
+        for col in COLUNAS_CATEGORICAS:
+            if col in dados.columns and not isinstance(dados[col].dtype, pd.CategoricalDtype):
+                dados[col] = dados[col].astype('category')
+        
+        # Garante que valores monetários sejam numéricos (float32)
         for col in ['VALOR TÉCNICO', 'VALOR EMPRESA']:
             if col in dados.columns:
-                dados[col] = pd.to_numeric(
-                    dados[col].astype(str)
-                    .str.replace('R$', '')
-                    .str.replace('.', '')
-                    .str.replace(',', '.'),
-                    errors='coerce'
-                )
+                if pd.api.types.is_numeric_dtype(dados[col]):
+                    # Já convertido no carregamento: não reprocessa como texto
+                    dados[col] = dados[col].astype('float32')
+                else:
+                    dados[col] = converter_valor_monetario(dados[col])
+        
+        # VALOR EMPRESA em centavos inteiros: somas exatas e 4 bytes por linha;
+        # as agregações convertem para reais só no resultado
+        if 'VALOR EMPRESA' in dados.columns:
+            dados['VALOR EMPRESA'] = np.rint(
+                dados['VALOR EMPRESA'].fillna(0).to_numpy(dtype=np.float64) * CENTAVOS
+            ).astype(np.int32)
+        
+        # Duração real do serviço a partir dos horários de início e fim
+        if 'TEMPO_MINUTOS' not in dados.columns and {'INÍCIO', 'FIM'} <= set(dados.columns):
+            dados['TEMPO_MINUTOS'] = calcular_tempo_minutos(dados['INÍCIO'], dados['FIM'])
         
         # Calcula métricas adicionais
         if 'TEMPO_MINUTOS' not in dados.columns:
-            # Calcula tempo médio por tipo de serviço
-            tempo_medio_servico = {
-                'ADESAO DE ASSINATURA': 90,
-                'MUDANCA DE ENDERECO': 120,
-                'VISITA TECNICA': 60,
-                'SERVICOS': 45,
-                'MUDANCA DE PACOTE': 30
-            }
-            
             # Aplica tempo médio baseado no tipo de serviço
-            dados['TEMPO_MINUTOS'] = dados['TIPO DE SERVIÇO'].map(
-                lambda x: tempo_medio_servico.get(x, 60)
-            )
+            dados['TEMPO_MINUTOS'] = estimar_tempo_minutos(dados['TIPO DE SERVIÇO'])
             
             st.info("Usando tempos médios estimados por tipo de serviço")
         
+        # Tempo em float32; negativos ou acima de um dia são tratados como inválidos
+        tempo = dados['TEMPO_MINUTOS'].astype('float32')
+        dados['TEMPO_MINUTOS'] = tempo.where((tempo >= 0) & (tempo <= 24 * 60))
+        
         # Adiciona outras métricas úteis
-        dados['VALOR_POR_MINUTO'] = dados['VALOR EMPRESA'] / dados['TEMPO_MINUTOS']
-        dados['MES'] = dados['DATA_TOA'].dt.month
-        dados['DIA_SEMANA'] = dados['DATA_TOA'].dt.day_name()
+        dados['EXECUTADO'] = (dados['STATUS'] == 'Executado').to_numpy()  # bool, 1 byte por linha
+        dados['VALOR_POR_MINUTO'] = dados['VALOR EMPRESA'] / CENTAVOS / dados['TEMPO_MINUTOS']
+        dados['MES'] = dados['DATA_TOA'].dt.month.astype('int8')
+        
+        # Hora de início do serviço (DATA_TOA só tem a data), calculada uma vez
+        if 'INÍCIO' in dados.columns:
+            dados['HORA'] = extrair_hora(dados['INÍCIO'])
+        else:
+            dados['HORA'] = dados['DATA_TOA'].dt.hour.astype('Int8')
+        dados['DIA_SEMANA_IDX'] = dados['DATA_TOA'].dt.dayofweek.astype('int8')  # 0 = segunda
         
         return dados
     
@@ -435,13 +416,159 @@ def preparar_dados(dados):
         st.error(f"Colunas disponíveis: {', '.join(dados.columns)}")
         raise e
 
-def mostrar_kpis(dados):
+@st.cache_data(show_spinner=False, max_entries=3)
+def preparar_dados_cache(_dados, nome_arquivo, mtime):
+    """Prepara os dados uma única vez por arquivo (chave: nome + mtime)"""
+    return preparar_dados(_dados)
+
+def agregar_por_hora(dados):
+    """Contagem, soma de valor e taxa de sucesso por hora (0-23) numa passada de bincount"""
+    validas = dados['HORA'].notna().to_numpy()
+    horas = dados['HORA'].to_numpy(dtype=np.int64, na_value=0)[validas]
+    valores = dados['VALOR EMPRESA'].to_numpy(dtype=np.float64)[validas]
+    executados = dados['EXECUTADO'].to_numpy()[validas]
+    
+    contagem = np.bincount(horas, minlength=24)
+    soma_valor = np.bincount(horas, weights=valores, minlength=24)
+    soma_executados = np.bincount(horas, weights=executados, minlength=24)
+    
+    observadas = contagem > 0
+    return pd.DataFrame({
+        'HORA': np.flatnonzero(observadas),
+        'CONTRATO': contagem[observadas],
+        'VALOR EMPRESA': soma_valor[observadas] / CENTAVOS,
+        'TAXA_SUCESSO': soma_executados[observadas] / contagem[observadas] * 100
+    })
+
+def agregar_por_tecnico(dados):
+    """
+    Contagem, valor, tempo médio e taxa de sucesso por técnico com bincount
+    sobre os códigos da categoria (uma passada por métrica, sem hash de grupos)
+    """
+    tecnicos = dados['TECNICO'].cat.categories
+    codigos = dados['TECNICO'].cat.codes.to_numpy()
+    valores = dados['VALOR EMPRESA'].to_numpy(dtype=np.float64)
+    tempos = dados['TEMPO_MINUTOS'].to_numpy(dtype=np.float64)
+    executados = dados['EXECUTADO'].to_numpy()
+    tempo_valido = ~np.isnan(tempos)
+    
+    n = len(tecnicos)
+    contagem = np.bincount(codigos, minlength=n)
+    soma_valor = np.bincount(codigos, weights=valores, minlength=n)
+    soma_executados = np.bincount(codigos, weights=executados, minlength=n)
+    contagem_tempo = np.bincount(codigos[tempo_valido], minlength=n)
+    soma_tempo = np.bincount(codigos[tempo_valido], weights=tempos[tempo_valido], minlength=n)
+    
+    observados = contagem > 0
+    contagem = contagem[observados]
+    with np.errstate(invalid='ignore'):  # técnico sem nenhum tempo válido -> NaN
+        tempo_medio = soma_tempo[observados] / contagem_tempo[observados]
+    return pd.DataFrame({
+        'TECNICO': tecnicos[observados],
+        'TOTAL_CONTRATOS': contagem,
+        'VALOR_TOTAL': soma_valor[observados] / CENTAVOS,
+        'VALOR_MEDIO': soma_valor[observados] / contagem / CENTAVOS,
+        'TEMPO_MEDIO': tempo_medio,
+        'TAXA_SUCESSO': soma_executados[observados] / contagem * 100
+    })
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def agregar_analises(_dados, chave):
+    """
+    Calcula todas as agregações das análises com um único groupby por chave
+    (cache por arquivo + filtros)
+    """
+    # TIPO DE SERVIÇO: tempo de execução e resumo por tipo
+    por_tipo_servico = _dados.groupby('TIPO DE SERVIÇO', observed=True).agg(
+        TOTAL_CONTRATOS=('CONTRATO', 'count'),
+        VALOR_TOTAL=('VALOR EMPRESA', 'sum'),
+        VALOR_MEDIO=('VALOR EMPRESA', 'mean'),
+        TEMPO_MEDIO=('TEMPO_MINUTOS', 'mean'),
+        QUANTIDADE=('TEMPO_MINUTOS', 'count')
+    )
+    por_tipo_servico[['VALOR_TOTAL', 'VALOR_MEDIO']] /= CENTAVOS
+    por_tipo_servico = por_tipo_servico.round(2).reset_index()
+    
+    # BASE: produtividade regional
+    por_base = _dados.groupby('BASE', observed=True).agg({
+        'CONTRATO': 'count',
+        'VALOR EMPRESA': 'sum',
+        'TECNICO': 'nunique'
+    }).reset_index()
+    por_base['VALOR EMPRESA'] /= CENTAVOS
+    por_base['CONTRATOS_POR_TECNICO'] = (por_base['CONTRATO'] / 
+                                        por_base['TECNICO']).round(2)
+    por_base['VALOR_MEDIO_CONTRATO'] = (por_base['VALOR EMPRESA'] / 
+                                       por_base['CONTRATO']).round(2)
+    
+    # TECNICO: eficiência e o KPI de contratos por técnico
+    por_tecnico = agregar_por_tecnico(_dados)
+    produtividade = por_tecnico['TOTAL_CONTRATOS'].mean()
+    por_tecnico = por_tecnico.round(2)
+    por_tecnico['PRODUTIVIDADE'] = (por_tecnico['TOTAL_CONTRATOS'] * 
+                                   por_tecnico['TAXA_SUCESSO'] / 100).round(2)
+    
+    # Hora do dia e dia da semana
+    por_hora = agregar_por_hora(_dados)
+    # Agrupa pelo índice inteiro do dia (já sai ordenado); nomes só nas 7 linhas finais
+    por_dia = _dados.groupby('DIA_SEMANA_IDX').agg({
+        'CONTRATO': 'count',
+        'VALOR EMPRESA': 'mean',
+        'EXECUTADO': 'mean'
+    }).rename(columns={'EXECUTADO': 'TAXA_SUCESSO'})
+    por_dia.insert(0, 'DIA_SEMANA', np.array(ORDEM_DIAS)[por_dia.index.to_numpy()])
+    por_dia = por_dia.reset_index(drop=True)
+    por_dia['TAXA_SUCESSO'] *= 100
+    por_dia['VALOR EMPRESA'] /= CENTAVOS
+    
+    # Histograma do tempo em 30 faixas (só as contagens vão para o navegador)
+    tempos = _dados['TEMPO_MINUTOS'].to_numpy()
+    histograma_tempo = np.histogram(tempos[~np.isnan(tempos)], bins=30)
+    
+    kpis = {
+        'taxa_sucesso': _dados['EXECUTADO'].mean() * 100,
+        'tempo_medio': _dados['TEMPO_MINUTOS'].mean(),
+        'valor_medio': _dados['VALOR EMPRESA'].mean() / CENTAVOS,
+        'produtividade': produtividade
+    }
+    
+    return {
+        'kpis': kpis,
+        'histograma_tempo': histograma_tempo,
+        'por_tipo_servico': por_tipo_servico,
+        'por_base': por_base,
+        'por_tecnico': por_tecnico,
+        'por_hora': por_hora,
+        'por_dia': por_dia
+    }
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def montar_figuras(_agregados, chave):
+    """
+    Monta as figuras Plotly de todas as análises uma vez por chave
+    (arquivo + filtros) e guarda o JSON de cada uma (reconstruído com
+    pio.from_json), para que nenhuma sessão altere as figuras de outra
+    """
+    figuras = {
+        'tempo_execucao': figuras_tempo_execucao(
+            _agregados['por_tipo_servico'],
+            _agregados['histograma_tempo'],
+            _agregados['kpis']['tempo_medio']
+        ),
+        'produtividade_regional': figuras_produtividade_regional(_agregados['por_base']),
+        'tipo_servico': figuras_tipo_servico(_agregados['por_tipo_servico']),
+        'horarios': figuras_horarios(_agregados['por_hora'], _agregados['por_dia']),
+        'eficiencia_tecnicos': figuras_eficiencia_tecnicos(_agregados['por_tecnico'])
+    }
+    return {nome: tuple(fig.to_json() for fig in figs) for nome, figs in figuras.items()}
+
+def mostrar_kpis(kpis):
     st.subheader("📊 KPIs Principais")
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        taxa_sucesso = (dados['STATUS'] == 'Executado').mean() * 100
+        taxa_sucesso = kpis['taxa_sucesso']
         st.metric(
             "Taxa de Sucesso",
             f"{taxa_sucesso:.1f}%",
@@ -449,7 +576,7 @@ def mostrar_kpis(dados):
         )
         
     with col2:
-        tempo_medio = dados['TEMPO_MINUTOS'].mean()
+        tempo_medio = kpis['tempo_medio']
         st.metric(
             "Tempo Médio",
             f"{tempo_medio:.1f} min",
@@ -457,7 +584,7 @@ def mostrar_kpis(dados):
         )
         
     with col3:
-        valor_medio = dados['VALOR EMPRESA'].mean()
+        valor_medio = kpis['valor_medio']
         st.metric(
             "Valor Médio",
             f"R$ {valor_medio:.2f}",
@@ -465,7 +592,7 @@ def mostrar_kpis(dados):
         )
         
     with col4:
-        produtividade = dados.groupby('TECNICO')['CONTRATO'].count().mean()
+        produtividade = kpis['produtividade']
         st.metric(
             "Contratos/Técnico",
             f"{produtividade:.1f}",
@@ -489,8 +616,8 @@ def main():
     
     if dashboard.carregar_dados(arquivo):
         try:
-            # Carrega e prepara os dados
-            dados = preparar_dados(dashboard.dados)
+            # Carrega e prepara os dados (uma vez por arquivo)
+            dados = preparar_dados_cache(dashboard.dados, arquivo, dashboard.mtime)
             
             # Filtros
             st.sidebar.title("Filtros")
@@ -517,42 +644,61 @@ def main():
                 max_value=data_max_default
             )
             
-            # Filtro de grupo/base
-            grupos_disponiveis = ['Todos'] + sorted(dados['GRUPO'].unique().tolist())
+            # Filtro de grupo/base (listas pré-calculadas no carregamento do arquivo)
+            opcoes = dashboard.opcoes_filtro
+            grupos_disponiveis = ['Todos'] + opcoes['grupos']
             grupo = st.sidebar.selectbox("Grupo", grupos_disponiveis)
             
             # Filtra bases baseado no grupo selecionado
             if grupo != 'Todos':
-                bases_filtradas = dados[dados['GRUPO'] == grupo]['BASE'].unique()
+                bases_filtradas = opcoes['bases_por_grupo'].get(grupo, [])
             else:
-                bases_filtradas = dados['BASE'].unique()
+                bases_filtradas = opcoes['bases']
             
-            bases_disponiveis = ['Todas'] + sorted(bases_filtradas.tolist())
+            bases_disponiveis = ['Todas'] + bases_filtradas
             base = st.sidebar.selectbox("Base", bases_disponiveis)
             
-            # Aplica filtros
-            mask = (dados['DATA_TOA'].dt.date >= data_min) & \
-                   (dados['DATA_TOA'].dt.date <= data_max)
+            # Aplica filtros direto nos arrays numpy (datetime64 e códigos das categorias)
+            datas = dados['DATA_TOA'].to_numpy()
+            mask = (datas >= np.datetime64(data_min)) & \
+                   (datas < np.datetime64(data_max) + np.timedelta64(1, 'D'))
             
             if grupo != 'Todos':
-                mask &= dados['GRUPO'] == grupo
+                mask &= filtro_categoria(dados['GRUPO'], grupo)
                 
             if base != 'Todas':
-                mask &= dados['BASE'] == base
+                mask &= filtro_categoria(dados['BASE'], base)
                 
-            dados_filtrados = dados[mask].copy()
+            dados_filtrados = dados[mask]  # Só leitura: sem cópia extra
             
             if len(dados_filtrados) == 0:
                 st.warning("Nenhum dado encontrado para os filtros selecionados")
                 return
                 
-            # Mostra análises
-            mostrar_kpis(dados_filtrados)
-            analisar_tempo_execucao(dados_filtrados)
-            analisar_produtividade_regional(dados_filtrados)
-            analisar_tipo_servico(dados_filtrados)
-            analisar_horarios(dados_filtrados)
-            analisar_eficiencia_tecnicos(dados_filtrados)
+            # Chave estável das agregações: arquivo + filtros (evita hashear o DataFrame)
+            chave = (arquivo, dashboard.mtime, data_min, data_max, grupo, base)
+            
+            agregados = agregar_analises(dados_filtrados, chave)
+            figuras = {
+                nome: tuple(pio.from_json(fig) for fig in figs)
+                for nome, figs in montar_figuras(agregados, chave).items()
+            }
+            
+            # Mostra análises (KPIs fixos no topo, uma aba por análise)
+            mostrar_kpis(agregados['kpis'])
+            aba_tempo, aba_regional, aba_servico, aba_periodo, aba_tecnicos = st.tabs([
+                "⏱️ Tempo", "🗺️ Regional", "🔧 Tipo de Serviço", "🕒 Período", "👨‍🔧 Técnicos"
+            ])
+            with aba_tempo:
+                analisar_tempo_execucao(figuras['tempo_execucao'])
+            with aba_regional:
+                analisar_produtividade_regional(figuras['produtividade_regional'], agregados['por_base'])
+            with aba_servico:
+                analisar_tipo_servico(figuras['tipo_servico'], agregados['por_tipo_servico'])
+            with aba_periodo:
+                analisar_horarios(figuras['horarios'], agregados['por_hora'])
+            with aba_tecnicos:
+                analisar_eficiencia_tecnicos(figuras['eficiencia_tecnicos'], agregados['por_tecnico'])
             
         except Exception as e:
             st.error(f"Erro ao processar os dados: {str(e)}")
@@ -2,21 +2,23 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
-from streamlit_app import DashboardTecnicos
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import IsolationForest
+from streamlit_app import (
+    DashboardTecnicos, calcular_tempo_minutos, estimar_tempo_minutos, extrair_hora, filtro_categoria
+)
 from datetime import timedelta
 import warnings
 
 # Filtra os avisos específicos do pandas sobre observed
 warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
 
+# Máximo de pontos normais enviados ao navegador no gráfico de anomalias
+MAX_PONTOS_NORMAIS = 5000
+
 def verificar_dados(dados):
     """Verifica se os dados têm as colunas necessárias"""
     colunas_necessarias = ['DATA_TOA', 'CONTRATO', 'VALOR EMPRESA', 'TEMPO_MINUTOS', 'STATUS', 'TECNICO']
-    colunas_faltantes = [col for col in colunas_necessarias if col not in dados.columns]
+    colunas = set(dados.columns)
+    colunas_faltantes = [col for col in colunas_necessarias if col not in colunas]
     
     if colunas_faltantes:
         st.error(f"❌ Colunas faltantes: {', '.join(colunas_faltantes)}")
@@ -24,38 +26,83 @@ def verificar_dados(dados):
         return False
     return True
 
+def preparar_dados(dados):
+    """Acrescenta TEMPO_MINUTOS (float32) e HORA (Int8) sem copiar as demais colunas"""
+    if {'INÍCIO', 'FIM'} <= set(dados.columns):
+        tempo = calcular_tempo_minutos(dados['INÍCIO'], dados['FIM']).astype(np.float32)
+        hora = extrair_hora(dados['INÍCIO'])
+    else:
+        tempo = estimar_tempo_minutos(dados['TIPO DE SERVIÇO'])
+        hora = dados['DATA_TOA'].dt.hour.astype('Int8')
+    # TECNICO e STATUS já chegam como category do carregamento: groupby pelos códigos
+    return dados.assign(TEMPO_MINUTOS=tempo, HORA=hora)
+
+@st.cache_data(show_spinner=False, max_entries=3)
+def preparar_dados_ia(_dados, nome_arquivo, mtime):
+    """Colunas derivadas calculadas uma vez por arquivo (chave: nome + mtime)"""
+    return preparar_dados(_dados)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def ajustar_previsao(demanda_diaria, dias=30):
+    """
+    Ajusta o modelo de suavização exponencial e prevê os próximos dias (cache por série).
+    Retorna a previsão e o desvio padrão dos resíduos do ajuste.
+    """
+    # Importações pesadas só na análise que as usa (o módulo fica em cache após a primeira)
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    
+    # Treina modelo com frequência explícita
+    model = ExponentialSmoothing(
+        demanda_diaria,
+        seasonal_periods=7,
+        trend='add',
+        seasonal='add',
+        freq='D'  # Especifica frequência diária
+    )
+    # Sem a busca em grade (brute) dos parâmetros iniciais: o L-BFGS parte direto da heurística
+    fit = model.fit(use_brute=False)
+    return fit.forecast(dias), float(np.nanstd(fit.resid))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def ajustar_clusters(X_scaled, n_clusters):
+    """Rótulos do K-means mini-batch (cache pelos bytes de X)"""
+    from sklearn.cluster import MiniBatchKMeans
+    
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=256, n_init=5, random_state=42)
+    return kmeans.fit_predict(X_scaled)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def ajustar_anomalias(_X, chave):
+    """
+    Rótulos do IsolationForest (-1 = anômalo, 1 = normal), com cache pela
+    chave do arquivo (nome + mtime) em vez do hash das linhas de X
+    """
+    from sklearn.ensemble import IsolationForest
+    
+    # Árvores treinadas em paralelo; 256 amostras por árvore já é o padrão 'auto' acima de 256 linhas
+    iso_forest = IsolationForest(max_samples=256, contamination=0.1, n_jobs=-1, random_state=42)
+    return iso_forest.fit_predict(_X)
+
 def prever_demanda(dados):
     """Prevê a demanda futura de serviços usando séries temporais"""
     st.subheader("🔮 Previsão de Demanda")
     
     try:
-        # Agrupa por data e conta serviços
-        demanda_diaria = dados.groupby('DATA_TOA', observed=True)['CONTRATO'].count()
-        
-        # Define frequência explicitamente
-        demanda_diaria = demanda_diaria.asfreq('D', fill_value=0)
-        
-        # Treina modelo com frequência explícita
-        model = ExponentialSmoothing(
-            demanda_diaria,
-            seasonal_periods=7,
-            trend='add',
-            seasonal='add',
-            freq='D'  # Especifica frequência diária
-        )
+        # Conta serviços por dia: resample já devolve a série com frequência 'D'
+        # e dias sem serviço zerados, sem hash das datas nem asfreq
+        demanda_diaria = dados.resample('D', on='DATA_TOA')['CONTRATO'].count().astype(np.int32)
         
         with st.spinner('Treinando modelo de previsão...'):
-            fit = model.fit()
-            
-            # Faz previsão para próximos 30 dias
-            forecast = fit.forecast(30)
+            # Faz previsão para próximos 30 dias (modelo reaproveitado entre reruns)
+            forecast, desvio_residuos = ajustar_previsao(demanda_diaria, 30)
             
-            # Calcula intervalos de confiança
+            # Intervalo de 95% pelos resíduos do ajuste, crescendo com o horizonte
+            margem = 1.96 * desvio_residuos * np.sqrt(np.arange(1, len(forecast) + 1))
             forecast_df = pd.DataFrame({
                 'ds': forecast.index,
                 'yhat': forecast.values,
-                'yhat_lower': forecast.values * 0.9,
-                'yhat_upper': forecast.values * 1.1
+                'yhat_lower': forecast.values - margem,
+                'yhat_upper': forecast.values + margem
             })
         
         # Plota resultados
@@ -79,45 +126,22 @@ def prever_demanda(dados):
         
         with col2:
             try:
-                # Análise semanal
-                dados_semanais = pd.DataFrame(demanda_diaria)
-                dados_semanais.columns = ['quantidade']  # Renomeia a coluna para um nome conhecido
-                dados_semanais['dia_semana'] = dados_semanais.index.day_name()
-                
-                # Dicionário para tradução dos dias
-                dias_semana = {
-                    'Monday': 'Segunda-feira',
-                    'Tuesday': 'Terça-feira',
-                    'Wednesday': 'Quarta-feira',
-                    'Thursday': 'Quinta-feira',
-                    'Friday': 'Sexta-feira',
-                    'Saturday': 'Sábado',
-                    'Sunday': 'Domingo'
-                }
-                
-                # Traduz os dias da semana
-                dados_semanais['dia_semana'] = dados_semanais['dia_semana'].map(dias_semana)
-                
-                # Calcula média por dia da semana usando o nome correto da coluna
-                media_semanal = dados_semanais.groupby('dia_semana', observed=True)['quantidade'].mean()
-                
-                # Ordena os dias da semana em português
-                ordem_dias = [
-                    'Segunda-feira', 'Terça-feira', 'Quarta-feira',
-                    'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo'
-                ]
-                
-                # Garante que todos os dias estejam presentes com valor 0 se não houver dados
-                for dia in ordem_dias:
-                    if dia not in media_semanal.index:
-                        media_semanal[dia] = 0
-                
-                media_semanal = media_semanal.reindex(ordem_dias)
+                # Análise semanal: média por código do dia (0 = segunda) com bincount
+                dia_semana = demanda_diaria.index.dayofweek.to_numpy()
+                dias_por_semana = np.bincount(dia_semana, minlength=7)
+                soma_semanal = np.bincount(dia_semana, weights=demanda_diaria.to_numpy(), minlength=7)
+                media_semanal = np.divide(
+                    soma_semanal, dias_por_semana,
+                    out=np.zeros(7), where=dias_por_semana > 0  # 0 para dias sem dados
+                )
                 
                 # Cria DataFrame para o gráfico
                 df_plot = pd.DataFrame({
-                    'Dia da Semana': media_semanal.index,
-                    'Média de Serviços': media_semanal.values
+                    'Dia da Semana': [
+                        'Segunda-feira', 'Terça-feira', 'Quarta-feira',
+                        'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo'
+                    ],
+                    'Média de Serviços': media_semanal
                 })
                 
                 fig = px.bar(
@@ -136,7 +160,6 @@ def prever_demanda(dados):
                 st.plotly_chart(fig, use_container_width=True)
             except Exception as e:
                 st.error(f"Erro na análise semanal: {str(e)}")
-                st.error("Dados disponíveis:", dados_semanais.columns.tolist())
         
         # Métricas de previsão
         st.write("### Métricas de Previsão")
@@ -172,39 +195,56 @@ def prever_demanda(dados):
         st.error(f"Erro ao gerar previsão: {str(e)}")
         st.error("Detalhes do erro:", e)
 
+def metricas_por_tecnico(dados):
+    """
+    Contratos, valor médio, tempo médio e taxa de sucesso (%) por técnico,
+    com bincount sobre os códigos da categoria TECNICO
+    """
+    tecnicos = dados['TECNICO'].cat.categories
+    codigos = dados['TECNICO'].cat.codes.to_numpy()
+    valores = dados['VALOR EMPRESA'].to_numpy(dtype=np.float64)
+    tempos = dados['TEMPO_MINUTOS'].to_numpy(dtype=np.float64)
+    executados = filtro_categoria(dados['STATUS'], 'Executado')
+    tempo_valido = ~np.isnan(tempos)
+    
+    n = len(tecnicos)
+    contagem = np.bincount(codigos, minlength=n)
+    soma_valor = np.bincount(codigos, weights=valores, minlength=n)
+    soma_executados = np.bincount(codigos, weights=executados, minlength=n)
+    contagem_tempo = np.bincount(codigos[tempo_valido], minlength=n)
+    soma_tempo = np.bincount(codigos[tempo_valido], weights=tempos[tempo_valido], minlength=n)
+    
+    observados = contagem > 0
+    contagem = contagem[observados]
+    with np.errstate(invalid='ignore'):  # técnico sem nenhum tempo válido -> NaN
+        tempo_medio = soma_tempo[observados] / contagem_tempo[observados]
+    return pd.DataFrame({
+        'TECNICO': tecnicos[observados],
+        'CONTRATO': contagem,
+        'VALOR EMPRESA': soma_valor[observados] / contagem,
+        'TEMPO_MINUTOS': tempo_medio,
+        'STATUS': soma_executados[observados] / contagem * 100
+    })
+
 def analisar_clusters_tecnicos(dados):
     """Agrupa técnicos em clusters por performance"""
     st.subheader("🎯 Análise de Clusters de Performance")
     
     try:
         # Prepara dados dos técnicos
-        metricas_tecnicos = dados.groupby('TECNICO', observed=True).agg({
-            'CONTRATO': 'count',
-            'VALOR EMPRESA': 'mean',
-            'TEMPO_MINUTOS': 'mean',
-            'STATUS': lambda x: (x == 'Executado').mean() * 100
-        }).reset_index()
+        metricas_tecnicos = metricas_por_tecnico(dados)
         
         # Seleciona features para clustering
         features = ['CONTRATO', 'VALOR EMPRESA', 'TEMPO_MINUTOS', 'STATUS']
-        X = metricas_tecnicos[features].values
-        
-        # Normaliza dados
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
+        X = metricas_tecnicos[features].to_numpy(dtype=np.float64)
         
-        # Determina número ideal de clusters
-        inertias = []
-        K = range(1, 10)
-        for k in K:
-            kmeans = KMeans(n_clusters=k)
-            kmeans.fit(X_scaled)
-            inertias.append(kmeans.inertia_)
+        # Normaliza dados (z-score por coluna; desvio zero vira 1, como no StandardScaler)
+        desvio = X.std(axis=0)
+        desvio[desvio == 0] = 1
+        X_scaled = np.ascontiguousarray((X - X.mean(axis=0)) / desvio, dtype=np.float32)  # K-means em float32
         
-        # Aplica K-means com número ideal de clusters
-        n_clusters = 3  # Pode ser ajustado baseado no elbow plot
-        kmeans = KMeans(n_clusters=n_clusters)
-        clusters = kmeans.fit_predict(X_scaled)
+        n_clusters = 3  # Número fixo de clusters
+        clusters = ajustar_clusters(X_scaled, n_clusters)
         
         # Adiciona clusters ao dataframe
         metricas_tecnicos['CLUSTER'] = clusters
@@ -226,52 +266,63 @@ def analisar_clusters_tecnicos(dados):
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            # Características dos clusters
-            for i in range(n_clusters):
+            # Características dos clusters (um único groupby para todos)
+            resumo_clusters = metricas_tecnicos.groupby('CLUSTER').agg(
+                QUANTIDADE=('TECNICO', 'count'),
+                MEDIA_CONTRATOS=('CONTRATO', 'mean'),
+                MEDIA_SUCESSO=('STATUS', 'mean')
+            )
+            for i, quantidade, media_contratos, media_sucesso in resumo_clusters.itertuples(name=None):
                 st.write(f"### Cluster {i}")
-                cluster_data = metricas_tecnicos[metricas_tecnicos['CLUSTER'] == i]
-                
-                st.write(f"Quantidade de técnicos: {len(cluster_data)}")
-                st.write(f"Média de contratos: {cluster_data['CONTRATO'].mean():.1f}")
-                st.write(f"Taxa média de sucesso: {cluster_data['STATUS'].mean():.1f}%")
+                st.write(f"Quantidade de técnicos: {quantidade}")
+                st.write(f"Média de contratos: {media_contratos:.1f}")
+                st.write(f"Taxa média de sucesso: {media_sucesso:.1f}%")
                 
-        # Lista técnicos por cluster
+        # Lista técnicos por cluster (técnicos separados uma vez, sem máscara por cluster)
         st.write("### Detalhamento dos Clusters")
-        for i in range(n_clusters):
+        for i, cluster_data in metricas_tecnicos.groupby('CLUSTER'):
             with st.expander(f"Cluster {i}"):
-                cluster_data = metricas_tecnicos[metricas_tecnicos['CLUSTER'] == i]
                 st.dataframe(cluster_data)
                 
     except Exception as e:
         st.error(f"Erro na análise de clusters: {str(e)}")
 
-def detectar_anomalias(dados):
-    """Detecta serviços com padrões anômalos"""
+def detectar_anomalias(dados, chave):
+    """Detecta serviços com padrões anômalos (`chave` identifica o arquivo carregado)"""
     st.subheader("🔍 Detecção de Anomalias")
     
     try:
         # Prepara features para detecção
         features = ['TEMPO_MINUTOS', 'VALOR EMPRESA']
-        X = dados[features].values
+        X = np.ascontiguousarray(dados[features].to_numpy(dtype=np.float32))
         
-        # Treina modelo
-        iso_forest = IsolationForest(contamination=0.1, random_state=42)
-        anomalias = iso_forest.fit_predict(X)
+        # Treina modelo (reaproveitado entre reruns com os mesmos dados)
+        anomalias = ajustar_anomalias(X, chave).astype(np.int8)
         
-        # Adiciona resultado ao dataframe
-        dados_anomalias = dados.copy()
-        dados_anomalias['ANOMALIA'] = anomalias
+        # Gráfico: todas as anomalias + amostra fixa dos normais (payload limitado)
+        normais = np.flatnonzero(anomalias == 1)
+        if normais.size > MAX_PONTOS_NORMAIS:
+            normais = np.sort(np.random.default_rng(0).choice(normais, MAX_PONTOS_NORMAIS, replace=False))
+        pontos = np.concatenate([normais, np.flatnonzero(anomalias == -1)])
+        
+        # Só as colunas do gráfico: evita copiar o dataframe inteiro para um rótulo
+        dados_grafico = pd.DataFrame({
+            'TEMPO_MINUTOS': X[pontos, 0],
+            'VALOR EMPRESA': X[pontos, 1],
+            'ANOMALIA': anomalias[pontos]
+        })
         
         # Visualizações
         col1, col2 = st.columns(2)
         
         with col1:
-            # Scatter plot de anomalias
+            # Scatter plot de anomalias (um ponto por serviço: WebGL em vez de SVG)
             fig = px.scatter(
-                dados_anomalias,
+                dados_grafico,
                 x='TEMPO_MINUTOS',
                 y='VALOR EMPRESA',
                 color='ANOMALIA',
+                render_mode='webgl',
                 title='Detecção de Serviços Anômalos',
                 labels={
                     'TEMPO_MINUTOS': 'Tempo (minutos)',
@@ -291,7 +342,7 @@ def detectar_anomalias(dados):
             
         # Detalhamento das anomalias
         st.write("### Serviços Anômalos Detectados")
-        anomalos = dados_anomalias[dados_anomalias['ANOMALIA'] == -1]
+        anomalos = dados[anomalias == -1]
         st.dataframe(anomalos)
         
     except Exception as e:
@@ -302,20 +353,24 @@ def gerar_recomendacoes(dados):
     st.subheader("💡 Recomendações Inteligentes")
     
     try:
-        # Análise de padrões de sucesso
-        dados_sucesso = dados[dados['STATUS'] == 'Executado']
-        
-        # Melhores horários
-        melhores_horarios = dados_sucesso.groupby('HORA', observed=True)['CONTRATO'].count()
+        # Análise de padrões de sucesso (máscara pelos códigos da categoria)
+        sucesso = filtro_categoria(dados['STATUS'], 'Executado')
+        dados_sucesso = dados[sucesso]
+        
+        # Melhores horários: histograma por hora (bincount) no lugar de um groupby
+        horas = dados_sucesso['HORA']
+        contagem = np.bincount(horas.dropna().to_numpy(dtype=np.int64), minlength=24)
+        melhores_horarios = pd.Series(contagem, name='CONTRATO').rename_axis('HORA')
+        melhores_horarios = melhores_horarios[melhores_horarios > 0]  # Só horas com serviço
         pior_horario = melhores_horarios.idxmin()
         melhor_horario = melhores_horarios.idxmax()
         
-        # Melhores técnicos
-        melhores_tecnicos = dados_sucesso.groupby('TECNICO', observed=True).agg({
-            'CONTRATO': 'count',
-            'VALOR EMPRESA': 'mean',
-            'TEMPO_MINUTOS': 'mean'
-        }).sort_values('CONTRATO', ascending=False)
+        # Top 10 técnicos (métricas dos clusters, só nos executados; nlargest sem ordenar todos)
+        melhores_tecnicos = (
+            metricas_por_tecnico(dados_sucesso)
+            .set_index('TECNICO')
+            .nlargest(10, 'CONTRATO')
+        )
         
         # Visualizações
         col1, col2 = st.columns(2)
@@ -332,7 +387,7 @@ def gerar_recomendacoes(dados):
         with col2:
             st.write("### Melhores Técnicos")
             fig = px.bar(
-                melhores_tecnicos.head(10),
+                melhores_tecnicos,
                 y='CONTRATO',
                 title='Top 10 Técnicos mais Produtivos'
             )
@@ -348,11 +403,12 @@ def gerar_recomendacoes(dados):
         
         with st.expander("👨‍🔧 Alocação de Técnicos"):
             st.write("Top 3 técnicos mais eficientes:")
-            for i, (tecnico, dados) in enumerate(melhores_tecnicos.head(3).iterrows(), 1):
+            top3 = melhores_tecnicos.head(3)[['CONTRATO', 'TEMPO_MINUTOS', 'VALOR EMPRESA']]
+            for i, (tecnico, servicos, tempo, valor) in enumerate(top3.itertuples(name=None), 1):
                 st.write(f"{i}. {tecnico}")
-                st.write(f"   - Serviços realizados: {dados['CONTRATO']:.0f}")
-                st.write(f"   - Tempo médio: {dados['TEMPO_MINUTOS']:.1f} min")
-                st.write(f"   - Valor médio: R$ {dados['VALOR EMPRESA']:.2f}")
+                st.write(f"   - Serviços realizados: {servicos:.0f}")
+                st.write(f"   - Tempo médio: {tempo:.1f} min")
+                st.write(f"   - Valor médio: R$ {valor:.2f}")
         
     except Exception as e:
         st.error(f"Erro ao gerar recomendações: {str(e)}")
@@ -372,7 +428,9 @@ def main():
     arquivo = arquivos[0]
     
     if dashboard.carregar_dados(arquivo):
-        dados = dashboard.dados.copy()
+        dados = preparar_dados_ia(dashboard.dados, arquivo, dashboard.mtime)
+        if not verificar_dados(dados):
+            return
         
         # Menu de análises
         analise = st.sidebar.selectbox(
@@ -389,7 +447,7 @@ def main():
         elif analise == "Clusters de Performance":
             analisar_clusters_tecnicos(dados)
         elif analise == "Detecção de Anomalias":
-            detectar_anomalias(dados)
+            detectar_anomalias(dados, (arquivo, dashboard.mtime))
         else:
             gerar_recomendacoes(dados)
 
@@ -1,17 +1,23 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from datetime import datetime
 import os
 import gc
+import json
 import warnings
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 
 # Filtra os avisos específicos do pandas sobre observed
 warnings.filterwarnings('ignore', category=FutureWarning, message='.*observed=False.*')
 
+# Copy-on-write: fatias e cópias rasas compartilham memória até serem alteradas
+pd.options.mode.copy_on_write = True
+
 # Adicione esta constante no início do arquivo, após os imports
 GRUPOS_BASES = {
     'Instalação': [
@@ -52,18 +58,279 @@ GRUPOS_BASES = {
     ]
 }
 
+# Colunas de texto com poucos valores distintos, agrupadas com frequência
+COLUNAS_CATEGORICAS = ['TIPO DE SERVIÇO', 'BASE', 'GRUPO', 'STATUS', 'TECNICO']
+
+# Nomes dos dias da semana, indexados por DIA_SEMANA_IDX (0 = segunda)
+ORDEM_DIAS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Grupo de cada base (inverso de GRUPOS_BASES), para busca direta
+BASE_PARA_GRUPO = {base: grupo for grupo, bases in GRUPOS_BASES.items() for base in bases}
+
 # Função auxiliar para encontrar o grupo de uma base
 def get_grupo_base(base):
-    for grupo, bases in GRUPOS_BASES.items():
-        if base in bases:
-            return grupo
-    return "Outros"  # Para bases que não estão em nenhum grupo
+    return BASE_PARA_GRUPO.get(base, "Outros")  # Para bases que não estão em nenhum grupo
+
+def grupo_por_base(bases):
+    """Coluna GRUPO categórica a partir de BASE: um lookup por categoria, não por linha"""
+    grupos = pd.Categorical([get_grupo_base(base) for base in bases.cat.categories])
+    codigos = bases.cat.codes.to_numpy()
+    codigos_grupo = np.where(codigos >= 0, grupos.codes[codigos], -1)  # BASE vazia continua vazia
+    return pd.Categorical.from_codes(codigos_grupo, categories=grupos.categories)
+
+_NAT_NS = np.iinfo(np.int64).min  # NaT visto como int64
+
+def _horarios_ns(horarios):
+    """
+    Horários HH:MM:SS em int64 ns (NaT = _NAT_NS); numa coluna category só as
+    categorias são convertidas, e cada linha busca o valor pelo código
+    """
+    if isinstance(horarios.dtype, pd.CategoricalDtype):
+        categorias = horarios.cat.categories
+        convertidas = pd.to_timedelta(
+            pd.Index([str(c) for c in categorias], dtype=object), errors='coerce'
+        ).to_numpy().view('i8')
+        tabela = np.append(convertidas, _NAT_NS)  # código -1 (vazio) cai em NaT
+        return tabela[horarios.cat.codes.to_numpy()]
+    return pd.to_timedelta(horarios.astype(str), errors='coerce').to_numpy().view('i8')
+
+def calcular_tempo_minutos(inicio, fim):
+    """Duração em minutos entre os horários INÍCIO e FIM (aritmética em int64 ns)"""
+    inicio_ns = _horarios_ns(inicio)
+    fim_ns = _horarios_ns(fim)
+    
+    minutos = (fim_ns - inicio_ns) * (1 / 6e10)
+    minutos[minutos < 0] += 24 * 60  # Serviço que passa da meia-noite
+    minutos[(inicio_ns == _NAT_NS) | (fim_ns == _NAT_NS)] = np.nan
+    return minutos
+
+# Tempo médio estimado (minutos) por tipo de serviço, quando não há INÍCIO/FIM
+TEMPO_MEDIO_SERVICO = {
+    'ADESAO DE ASSINATURA': 90,
+    'MUDANCA DE ENDERECO': 120,
+    'VISITA TECNICA': 60,
+    'SERVICOS': 45,
+    'MUDANCA DE PACOTE': 30
+}
+TEMPO_MEDIO_PADRAO = 60
+
+def estimar_tempo_minutos(tipos_servico):
+    """Tempo estimado por linha (float32): tabela por código da categoria, sem dict por linha"""
+    categorias = tipos_servico.cat.categories
+    tempos = np.array(
+        [TEMPO_MEDIO_SERVICO.get(tipo, TEMPO_MEDIO_PADRAO) for tipo in categorias] + [TEMPO_MEDIO_PADRAO],
+        dtype=np.float32
+    )
+    return tempos[tipos_servico.cat.codes.to_numpy()]  # código -1 (vazio) cai no padrão
+
+# Tabela de tradução dos valores em texto: remove "R$", separador de milhar e
+# espaços e troca a vírgula decimal por ponto, tudo numa única passada por valor
+_TRADUCAO_MOEDA = str.maketrans({'R': None, '$': None, '.': None, ' ': None, '\xa0': None, ',': '.'})
+
+def converter_valor_monetario(valores):
+    """Texto "R$ 1.234,56" -> float32; valores que já são números passam direto"""
+    texto = [v.translate(_TRADUCAO_MOEDA) if isinstance(v, str) else v for v in valores.to_numpy()]
+    return pd.Series(pd.to_numeric(texto, errors='coerce'), index=valores.index).astype('float32')
+
+def filtro_categoria(coluna, valor):
+    """Máscara `coluna == valor` comparando os códigos inteiros da categoria"""
+    categorias = coluna.cat.categories
+    if valor not in categorias:
+        return np.zeros(len(coluna), dtype=bool)
+    return coluna.cat.codes.to_numpy() == categorias.get_loc(valor)
+
+def filtro_categorias(coluna, valores):
+    """Máscara `coluna.isin(valores)` sobre os códigos inteiros da categoria"""
+    codigos = coluna.cat.categories.get_indexer(list(valores))
+    return np.isin(coluna.cat.codes.to_numpy(), codigos[codigos >= 0])
+
+def filtro_desconexao(tipos_servico):
+    """Máscara dos serviços de desconexão: o padrão é buscado só nas categorias"""
+    categorias = tipos_servico.cat.categories
+    codigos = np.flatnonzero(categorias.str.contains('DESCONEX', case=False, na=False))
+    return np.isin(tipos_servico.cat.codes.to_numpy(), codigos)
+
+def contar_distintos_por_codigo(codigos, ids, n_codigos):
+    """
+    nunique de `ids` (inteiros >= 0; -1 = vazio) por código de grupo: pares
+    (grupo, id) distintos contados com np.bincount
+    """
+    validos = ids >= 0
+    if not validos.all():
+        codigos, ids = codigos[validos], ids[validos]
+    if ids.size == 0:
+        return np.zeros(n_codigos, dtype=np.int64)
+    n_ids = int(ids.max()) + 1
+    pares = np.unique(codigos.astype(np.int64) * n_ids + ids)
+    return np.bincount(pares // n_ids, minlength=n_codigos)
+
+def metricas_por_base(dados):
+    """
+    Técnicos e contratos distintos e somas de valores por BASE, com
+    np.bincount sobre os códigos da categoria (só bases com registros)
+    """
+    bases = dados['BASE'].cat.categories
+    cod_base = dados['BASE'].cat.codes.to_numpy().astype(np.intp)
+    com_base = cod_base >= 0  # BASE vazia fica fora, como no groupby
+    if not com_base.all():
+        dados, cod_base = dados[com_base], cod_base[com_base]
+    n_bases = len(bases)
+    
+    def somar(coluna):
+        valores = np.nan_to_num(dados[coluna].to_numpy(dtype=np.float64))
+        # Soma em float64 devolvida no tipo da coluna, como o groupby faz
+        return np.bincount(cod_base, weights=valores, minlength=n_bases).astype(dados[coluna].dtype)
+    
+    observadas = np.bincount(cod_base, minlength=n_bases) > 0
+    metricas = pd.DataFrame(
+        {
+            'Total Técnicos': contar_distintos_por_codigo(
+                cod_base, dados['TECNICO'].cat.codes.to_numpy(), n_bases),
+            'Total Contratos': contar_distintos_por_codigo(
+                cod_base, pd.factorize(dados['CONTRATO'])[0], n_bases),
+            'Valor Técnicos': somar('VALOR TÉCNICO'),
+            'Valor Empresa': somar('VALOR EMPRESA')
+        },
+        index=pd.CategoricalIndex(bases, categories=bases, name='BASE')
+    )
+    return metricas[observadas]
+
+def adicionar_metricas_equipe(agregado):
+    """
+    VL EQ (valor por equipe) e EQ_CTTS (contratos por equipe) numa divisão
+    vetorizada; bases sem técnicos ficam com 0
+    """
+    tecnicos = agregado['TECNICO'].to_numpy(dtype=np.float64)
+    com_equipe = tecnicos > 0
+    
+    def por_equipe(coluna):
+        valores = agregado[coluna].to_numpy(dtype=np.float64)
+        return np.divide(valores, tecnicos, out=np.zeros(len(agregado)), where=com_equipe)
+    
+    return agregado.assign(**{
+        'VL EQ': np.round(por_equipe('VALOR EMPRESA'), 2),
+        'EQ_CTTS': np.round(por_equipe('CONTRATO'), 1)
+    })
+
+def adicionar_total_geral(tabela):
+    """
+    Acrescenta a linha "Total Geral" a uma tabela por base (colunas: base,
+    valor, contratos, equipes, VL EQ, EQ_CTTS), sem montar outro DataFrame
+    """
+    valor, contratos, equipes = (tabela[coluna].sum() for coluna in tabela.columns[1:4])
+    vl_eq = round(valor / equipes, 2) if equipes > 0 else 0
+    eq_ctts = round(contratos / equipes, 1) if equipes > 0 else 0
+    
+    # Texto no lugar da categoria (a base "Total Geral" não existe nos dados)
+    tabela = tabela.astype({tabela.columns[0]: object}).reset_index(drop=True)
+    tabela.loc[len(tabela)] = ['Total Geral', valor, contratos, equipes, vl_eq, eq_ctts]
+    return tabela
+
+def extrair_hora(horarios):
+    """Hora do dia (0-23, Int8) de uma coluna de horários HH:MM:SS"""
+    ns = _horarios_ns(horarios)
+    horas = (ns // 3_600_000_000_000 % 24).astype(np.int8)
+    return pd.Series(pd.arrays.IntegerArray(horas, ns == _NAT_NS), index=horarios.index)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _listar_arquivos(pasta_dados):
+    """Lista (com cache) os arquivos Excel/CSV/Parquet da pasta, em ordem alfabética"""
+    return sorted(f for f in os.listdir(pasta_dados) if f.endswith(('.xlsx', '.csv', '.parquet')))
+
+# Subpasta (oculta) com cópias Parquet das planilhas, já com os tipos finais
+# (valores float32, categorias, datas): evita reler o Excel com openpyxl e
+# refazer a limpeza dos textos depois que o processo reinicia
+PASTA_CACHE_PARQUET = '.cache'
+
+# Chave nos metadados do Parquet com as colunas pedidas quando a cópia foi
+# gravada (a planilha pode não ter as opcionais, como INÍCIO/FIM)
+CHAVE_COLUNAS_PEDIDAS = b'basicdash.colunas_pedidas'
+
+def _ler_parquet(caminho, colunas):
+    """Lê do Parquet apenas as colunas pedidas que existem no arquivo"""
+    existentes = set(pq.read_schema(caminho).names)
+    return pd.read_parquet(
+        caminho,
+        columns=[coluna for coluna in colunas if coluna in existentes],
+        engine='pyarrow',
+        memory_map=True  # Mapeia o arquivo em vez de copiá-lo para um buffer
+    )
+
+def _parquet_atualizado(caminho_parquet, caminho_origem, colunas):
+    """
+    Verifica se a cópia Parquet é mais nova que a planilha e foi gravada a
+    partir de uma leitura com as colunas pedidas (mesmo que a planilha não
+    tenha todas elas)
+    """
+    if not os.path.exists(caminho_parquet):
+        return False
+    if os.path.getmtime(caminho_parquet) < os.path.getmtime(caminho_origem):
+        return False
+    esquema = pq.read_schema(caminho_parquet)
+    pedidas = (esquema.metadata or {}).get(CHAVE_COLUNAS_PEDIDAS)
+    if pedidas is None:
+        # Cópias antigas, sem o registro: exige todas as colunas no arquivo
+        return set(colunas) <= set(esquema.names)
+    return set(colunas) <= set(json.loads(pedidas))
+
+def _ler_excel(caminho, usecols):
+    """Lê a planilha com o leitor calamine (Rust) quando instalado, senão com openpyxl"""
+    try:
+        from python_calamine import CalamineError
+    except ImportError:
+        return pd.read_excel(caminho, usecols=usecols, engine='openpyxl')
+    try:
+        return pd.read_excel(caminho, usecols=usecols, engine='calamine')
+    except (ImportError, CalamineError) as e:
+        # ImportError: versão do python-calamine incompatível com o pandas
+        st.warning(f"Falha ao ler com calamine, usando openpyxl: {e}")
+    return pd.read_excel(caminho, usecols=usecols, engine='openpyxl')
+
+# Colunas de medida que podem ir para float32; identificadores como CONTRATO
+# (float64 quando têm vazios) perderiam dígitos acima de 2**24
+COLUNAS_MEDIDA = ('VALOR TÉCNICO', 'VALOR EMPRESA', 'TEMPO_MINUTOS')
+
+def _reduzir_tipos(df, limite_categoria=0.5):
+    """
+    Passada única de redução de memória após o carregamento: inteiros para o
+    menor tipo que comporta os valores, float64 para float32 (só nas
+    COLUNAS_MEDIDA) e colunas de texto com poucos valores distintos
+    (< `limite_categoria` das linhas) para category
+    """
+    for coluna in df.columns:
+        serie = df[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(serie.dtype):
+            sem_sinal = len(serie) > 0 and serie.min() >= 0
+            df[coluna] = pd.to_numeric(serie, downcast='unsigned' if sem_sinal else 'integer')
+        elif serie.dtype == np.float64 and coluna in COLUNAS_MEDIDA:
+            df[coluna] = serie.astype(np.float32)
+        elif serie.dtype == object and serie.nunique() < limite_categoria * len(serie):
+            df[coluna] = serie.astype('category')
+    return df
+
+def _salvar_parquet(df, caminho_parquet, colunas):
+    """
+    Grava a cópia Parquet da planilha, registrando as colunas pedidas na
+    leitura (falhas não impedem o carregamento)
+    """
+    try:
+        os.makedirs(os.path.dirname(caminho_parquet), exist_ok=True)
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[CHAVE_COLUNAS_PEDIDAS] = json.dumps(list(colunas)).encode('utf-8')
+        pq.write_table(tabela.replace_schema_metadata(metadados), caminho_parquet, compression='zstd')
+    except Exception as e:
+        print(f"Não foi possível salvar a cópia Parquet: {e}")
 
 class DashboardTecnicos:
     def __init__(self):
         self.dados = None
         self.pasta_dados = "Dados_excel"
         self.cached_file = None
+        self.opcoes_filtro = None
+        self.mtime = None
         
         # Verifica se a pasta existe
         if not os.path.exists(self.pasta_dados):
@@ -73,7 +340,8 @@ class DashboardTecnicos:
         # Colunas que realmente vamos usar
         self.colunas_necessarias = [
             'TECNICO', 'DATA_TOA', 'CONTRATO', 'STATUS', 
-            'TIPO DE SERVIÇO', 'VALOR TÉCNICO', 'VALOR EMPRESA', 'BASE'
+            'TIPO DE SERVIÇO', 'VALOR TÉCNICO', 'VALOR EMPRESA', 'BASE',
+            'INÍCIO', 'FIM'
         ]
         
         # Otimização: Definir tipos de dados específicos para cada coluna
@@ -82,7 +350,8 @@ class DashboardTecnicos:
             'BASE': 'category',
             'STATUS': 'category',
             'TIPO DE SERVIÇO': 'category',
-            'CONTRATO': 'category',
+            # float32 guarda ~7 dígitos significativos: sobra para valores de
+            # linha em R$ com centavos; somas grandes podem variar em centavos
             'VALOR TÉCNICO': 'float32',   # Reduz precisão para economizar memória
             'VALOR EMPRESA': 'float32'
         }
@@ -98,15 +367,14 @@ class DashboardTecnicos:
                 st.error(f"Pasta {self.pasta_dados} não encontrada")
                 return []
             
-            arquivos = [f for f in os.listdir(self.pasta_dados) 
-                       if f.endswith(('.xlsx', '.csv'))]
+            arquivos = _listar_arquivos(self.pasta_dados)
             
             if not arquivos:
                 st.warning(f"Nenhum arquivo Excel/CSV encontrado em {self.pasta_dados}")
                 st.info("Formatos suportados: .xlsx, .csv")
                 return []
             
-            return sorted(arquivos)  # Retorna arquivos em ordem alfabética
+            return arquivos
         
         except Exception as e:
             st.error(f"Erro ao listar arquivos: {e}")
@@ -125,46 +393,66 @@ class DashboardTecnicos:
 
     # Alternativa: podemos também tornar o método estático
     @staticmethod
-    @st.cache_data(ttl=3600, show_spinner=False, max_entries=3)  # Limita o número de entradas em cache
-    def carregar_dados_cache_alt(pasta_dados, nome_arquivo, colunas, dtypes):
+    @st.cache_data(ttl=3600, show_spinner="Carregando dados...", max_entries=3)  # Limita o número de entradas em cache
+    def carregar_dados_cache_alt(pasta_dados, nome_arquivo, colunas, dtypes, mtime=None):
         """
         Versão otimizada do carregamento de dados
+        
+        O `mtime` do arquivo entra na chave do cache: o arquivo só é lido
+        novamente quando é modificado em disco.
         """
         caminho_completo = os.path.join(pasta_dados, nome_arquivo)
         
+        # Colunas ausentes no arquivo (ex.: INÍCIO/FIM em planilhas antigas) são ignoradas
+        usar_coluna = lambda coluna: coluna in colunas
+        
+        # Cópia Parquet a gravar depois da conversão de tipos (só quando o Excel foi lido)
+        caminho_salvar = None
+        
         # Primeiro carrega sem definir dtypes
-        if nome_arquivo.endswith('.xlsx'):
-            df = pd.read_excel(
-                caminho_completo,
-                usecols=colunas,
-                engine='openpyxl'
-            )
+        if nome_arquivo.endswith('.parquet'):
+            df = _ler_parquet(caminho_completo, colunas)
+        elif nome_arquivo.endswith('.xlsx'):
+            caminho_parquet = os.path.join(pasta_dados, PASTA_CACHE_PARQUET, nome_arquivo + '.parquet')
+            if _parquet_atualizado(caminho_parquet, caminho_completo, colunas):
+                df = _ler_parquet(caminho_parquet, colunas)
+            else:
+                df = _ler_excel(caminho_completo, usar_coluna)
+                caminho_salvar = caminho_parquet
         elif nome_arquivo.endswith('.csv'):
+            # Colunas de texto já viram categoria no parser C (BASE passa antes
+            # pela limpeza abaixo; os valores em "R$" ainda precisam de conversão)
+            categorias_csv = {
+                coluna: 'category' for coluna, tipo in dtypes.items()
+                if tipo == 'category' and coluna != 'BASE'
+            }
             df = pd.read_csv(
                 caminho_completo,
-                usecols=colunas,
+                usecols=usar_coluna,
+                dtype=categorias_csv,
+                engine='c',
                 low_memory=False
             )
             
         # Trata as colunas de valor antes de converter os tipos
         for coluna in ['VALOR TÉCNICO', 'VALOR EMPRESA']:
-            if coluna in df.columns:
-                df[coluna] = (pd.to_numeric(
-                    df[coluna]
-                    .astype(str)
-                    .str.replace(r'[R$.]', '', regex=True)  # Remove R$ e pontos
-                    .str.replace(',', '.', regex=False)     # Troca vírgula por ponto
-                    .str.strip(),
-                    errors='coerce'
-                ).fillna(0))
+            if coluna in df.columns and not pd.api.types.is_numeric_dtype(df[coluna]):
+                df[coluna] = converter_valor_monetario(df[coluna]).fillna(0)
         
         # Trata a coluna BASE antes de converter para category
-        if 'BASE' in df.columns:
+        if 'BASE' in df.columns and not isinstance(df['BASE'].dtype, pd.CategoricalDtype):
             df['BASE'] = df['BASE'].fillna('Não Informado').str.strip()
             
-        # Agora converte os tipos de forma segura
+        # Agora converte os tipos de forma segura (colunas já tipadas, como as
+        # da cópia Parquet, ficam como estão)
         for coluna, tipo in dtypes.items():
-            if coluna in df.columns:
+            if tipo == 'category' and coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                # Já é categoria (CSV ou Parquet): só completa os valores vazios
+                if df[coluna].isna().any():
+                    categorias = df[coluna].cat.categories.union(['Não Informado'])  # em ordem alfabética
+                    df[coluna] = df[coluna].cat.set_categories(categorias).fillna('Não Informado')
+                continue
+            if coluna in df.columns and df[coluna].dtype != tipo:
                 try:
                     if tipo == 'category':
                         # Para colunas categoria, garantimos que não há valores vazios
@@ -173,8 +461,226 @@ class DashboardTecnicos:
                 except Exception as e:
                     print(f"Erro ao converter coluna {coluna}: {e}")
         
+        # Otimiza processamento de datas (a cópia Parquet já traz datetime64;
+        # só texto vindo da planilha ou do CSV precisa ser interpretado)
+        if 'DATA_TOA' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['DATA_TOA']):
+            df['DATA_TOA'] = pd.to_datetime(
+                df['DATA_TOA'],
+                dayfirst=True,  # Especifica que o dia vem primeiro
+                errors='coerce',
+                cache=True  # Reaproveita a conversão de datas repetidas
+            )
+        
+        # Ajusta os tipos restantes (ex.: CONTRATO uint32 no lugar de int64,
+        # horários INÍCIO/FIM repetidos como category)
+        df = _reduzir_tipos(df)
+        
+        if caminho_salvar:
+            _salvar_parquet(df, caminho_salvar, colunas)
+        
+        # Adiciona coluna de grupo (categórica, como BASE)
+        if 'BASE' in df.columns:
+            df['GRUPO'] = grupo_por_base(df['BASE'])
+        
         return df
 
+    @staticmethod
+    @st.cache_data(show_spinner=False, max_entries=3)
+    def calcular_opcoes_filtro(_dados, nome_arquivo, mtime):
+        """
+        Calcula uma única vez por arquivo as listas ordenadas usadas nos filtros
+        """
+        bases_por_grupo = {
+            grupo: sorted(bases.tolist())
+            for grupo, bases in _dados.groupby('GRUPO', observed=True)['BASE'].unique().items()
+        }
+        return {
+            'grupos': _dados['GRUPO'].cat.categories.tolist(),
+            'bases': _dados['BASE'].cat.categories.tolist(),
+            'status': _dados['STATUS'].cat.categories.tolist(),
+            'bases_por_grupo': bases_por_grupo
+        }
+
+    @staticmethod
+    @st.cache_data(show_spinner=False, max_entries=32)
+    def calcular_visoes_produtividade(_dados, nome_arquivo, mtime, grupo, base, status):
+        """
+        Aplica os filtros e calcula as agregações da análise de produtividade,
+        uma vez por combinação (arquivo, grupo, base, status)
+        """
+        # Máscara única em numpy: datas válidas + códigos de categoria
+        mask = ~np.isnat(_dados['DATA_TOA'].to_numpy())
+        if grupo != 'Todos':
+            mask &= filtro_categoria(_dados['GRUPO'], grupo)
+        if base != 'Todas':
+            mask &= filtro_categoria(_dados['BASE'], base)
+        mask &= filtro_categorias(_dados['STATUS'], status)
+        
+        dados_filtrados = _dados[mask]
+        if len(dados_filtrados) == 0:
+            return None
+        
+        # Agregação única por base (só bases com registros), reaproveitada
+        # pela tabela, pelos totais e pelo gráfico de valores
+        metricas_base = metricas_por_base(dados_filtrados)
+        
+        visoes = {
+            'total_registros': len(dados_filtrados),
+            'total_tecnicos': dados_filtrados['TECNICO'].nunique(),
+            'total_contratos': dados_filtrados['CONTRATO'].nunique(),
+            'metricas_base': metricas_base
+        }
+        
+        if base != 'Todas':
+            # Produtividade por técnico da base selecionada
+            visoes['prod_tecnico'] = (dados_filtrados
+                .groupby('TECNICO', observed=True)
+                .agg(**{
+                    'Contratos': ('CONTRATO', 'nunique'),
+                    'Valor Técnico': ('VALOR TÉCNICO', 'sum'),
+                    'Valor Empresa': ('VALOR EMPRESA', 'sum')
+                })
+                .rename_axis('Técnico')
+                .reset_index()
+                .sort_values('Contratos', ascending=False)  # Ordena por contratos
+            )
+            visoes['servicos_analise'] = (dados_filtrados
+                .groupby('TIPO DE SERVIÇO', observed=True)['CONTRATO'].nunique()
+                .reset_index()
+                .sort_values('CONTRATO', ascending=False)
+            )
+        else:
+            visoes['servicos_analise'] = (dados_filtrados
+                .groupby(['BASE', 'TIPO DE SERVIÇO'], observed=True)['CONTRATO'].nunique()
+                .reset_index()
+                .sort_values(['BASE', 'CONTRATO'], ascending=[True, False])
+            )
+        return visoes
+
+    @staticmethod
+    @st.cache_data(show_spinner=False, max_entries=32)
+    def calcular_visoes_status(_dados, nome_arquivo, mtime, base):
+        """
+        Aplica o filtro de base e calcula as agregações da análise de status,
+        uma vez por combinação (arquivo, base)
+        """
+        if base != 'Todas':
+            dados_filtrados = _dados[filtro_categoria(_dados['BASE'], base)]
+        else:
+            dados_filtrados = _dados
+        
+        # Agregação única por STATUS: contratos distintos e valores,
+        # usada pelo gráfico de status e pela tabela resumo
+        resumo_status = dados_filtrados.groupby('STATUS', observed=True).agg(**{
+            'Quantidade de Contratos': ('CONTRATO', 'nunique'),
+            'Valor Técnico': ('VALOR TÉCNICO', 'sum'),
+            'Valor Empresa': ('VALOR EMPRESA', 'sum')
+        }).rename_axis('Status').reset_index()
+        
+        # Contratos distintos por dia e status
+        status_temporal = dados_filtrados.groupby([
+            dados_filtrados['DATA_TOA'].dt.normalize(),  # dia em datetime64, sem objetos date
+            'STATUS'
+        ], observed=True)['CONTRATO'].nunique().reset_index()
+        
+        return resumo_status, status_temporal
+
+    @staticmethod
+    @st.cache_data(show_spinner=False, max_entries=32)
+    def montar_graficos_produtividade(_visoes, nome_arquivo, mtime, grupo, base, status):
+        """
+        Monta os gráficos da análise de produtividade uma vez por combinação de
+        filtros e guarda o JSON de cada figura (reconstruído com pio.from_json)
+        """
+        graficos = {}
+        servicos_analise = _visoes['servicos_analise']
+        
+        if base != 'Todas':
+            # Remove técnicos com 0 contratos
+            prod_tecnico = _visoes['prod_tecnico']
+            prod_tecnico = prod_tecnico[prod_tecnico['Contratos'] > 0]
+            
+            fig = px.bar(prod_tecnico, 
+                       x='Contratos',
+                       y='Técnico',
+                       title=f'Contratos Executados por Técnico - {base}',
+                       height=max(600, len(prod_tecnico) * 25),  # Altura dinâmica
+                       orientation='h'  # Barras horizontais
+            )
+            
+            fig.update_layout(
+                showlegend=False,
+                xaxis_title="Quantidade de Contratos",
+                yaxis_title="Técnico",
+                yaxis={'categoryorder':'total descending'},  # Ordena do maior para o menor
+                margin=dict(l=250, r=50)  # Margem para nomes longos
+            )
+            
+            # Adiciona rótulos nas barras
+            fig.update_traces(
+                texttemplate='%{x}',
+                textposition='outside',
+            )
+            graficos['tecnicos'] = fig.to_json()
+            
+            # Se uma base específica foi selecionada, mostra apenas dados dela
+            fig = px.bar(servicos_analise, 
+                        x='CONTRATO',
+                        y='TIPO DE SERVIÇO',
+                        title=f'Contratos por Tipo de Serviço - {base}',
+                        height=max(400, len(servicos_analise) * 30),
+                        orientation='h')
+        else:
+            # Se "Todas" as bases, mantém a visualização por base
+            fig = px.bar(servicos_analise, 
+                        y='BASE',
+                        x='CONTRATO',
+                        color='TIPO DE SERVIÇO',
+                        title='Contratos por Tipo de Serviço e Base',
+                        height=max(400, len(servicos_analise['BASE'].unique()) * 50),
+                        barmode='group')
+        
+        fig.update_layout(
+            showlegend=True,
+            xaxis_title="Quantidade de Contratos",
+            yaxis_title="Tipo de Serviço" if base != 'Todas' else "Base",
+            yaxis={'categoryorder':'total ascending'},
+            legend_title="Tipo de Serviço"
+        )
+        
+        # Adiciona rótulos nas barras se for base específica
+        if base != 'Todas':
+            fig.update_traces(
+                texttemplate='%{x}',
+                textposition='outside',
+            )
+        graficos['servicos'] = fig.to_json()
+        
+        if base == 'Todas':
+            # Valores por base (técnico e empresa)
+            valores_base = _visoes['metricas_base'][['Valor Técnicos', 'Valor Empresa']].rename(columns={
+                'Valor Técnicos': 'VALOR TÉCNICO',
+                'Valor Empresa': 'VALOR EMPRESA'
+            }).reset_index()
+            
+            fig = px.bar(valores_base,
+                       y='BASE',
+                       x=['VALOR TÉCNICO', 'VALOR EMPRESA'],
+                       title='Valores por Base',
+                       height=max(400, len(valores_base) * 50),
+                       barmode='group')
+            
+            fig.update_layout(
+                showlegend=True,
+                xaxis_title="Valor (R$)",
+                yaxis_title="Base",
+                yaxis={'categoryorder':'total ascending'},
+                xaxis=dict(tickformat="R$ ,.2f")
+            )
+            graficos['valores'] = fig.to_json()
+        
+        return graficos
+
     def carregar_dados(self, nome_arquivo):
         """
         Carrega e processa os dados de forma otimizada
@@ -188,28 +694,18 @@ class DashboardTecnicos:
                 del self.dados
                 gc.collect()
                 
-            # Carrega dados com otimizações
+            # Carrega dados com otimizações (datas e GRUPO já vêm do cache)
+            mtime = os.path.getmtime(os.path.join(self.pasta_dados, nome_arquivo))
             self.dados = self.carregar_dados_cache_alt(
                 self.pasta_dados, 
                 nome_arquivo, 
                 self.colunas_necessarias,
-                self.dtypes
+                self.dtypes,
+                mtime
             )
             self.cached_file = nome_arquivo
-            
-            # Otimiza processamento de datas
-            if 'DATA_TOA' in self.dados.columns:
-                self.dados['DATA_TOA'] = pd.to_datetime(
-                    self.dados['DATA_TOA'],
-                    dayfirst=True,  # Especifica que o dia vem primeiro
-                    errors='coerce'
-                )
-            
-            # Otimiza memória
-            self.dados = self.dados.copy()
-            
-            # Adiciona coluna de grupo
-            self.dados['GRUPO'] = self.dados['BASE'].apply(get_grupo_base)
+            self.mtime = mtime
+            self.opcoes_filtro = self.calcular_opcoes_filtro(self.dados, nome_arquivo, mtime)
             
             return True
             
@@ -249,22 +745,21 @@ class DashboardTecnicos:
                 return
             
             # Verifica se há datas válidas
-            datas_validas = self.dados['DATA_TOA'].dropna()
-            if len(datas_validas) == 0:
+            if self.dados['DATA_TOA'].isna().all():
                 st.error("Não foi possível processar as datas no arquivo")
                 return
             
-            data_min = datas_validas.min()
-            data_max = datas_validas.max()
-            
             # Filtros
             st.write("### Filtros")
             col1, col2, col3 = st.columns(3)  # Mudamos para 3 colunas
             
+            # Listas dos filtros pré-calculadas no carregamento do arquivo
+            opcoes = self.opcoes_filtro
+            
             # Filtro de GRUPO e BASE
             with col1:
                 if 'GRUPO' in self.dados.columns:
-                    grupos_disponiveis = ['Todos'] + sorted(self.dados['GRUPO'].unique().tolist())
+                    grupos_disponiveis = ['Todos'] + opcoes['grupos']
                     grupo_selecionado = st.selectbox(
                         "Selecione o Grupo:",
                         grupos_disponiveis,
@@ -273,11 +768,11 @@ class DashboardTecnicos:
                     
                     # Filtra as bases baseado no grupo selecionado
                     if grupo_selecionado != 'Todos':
-                        bases_filtradas = self.dados[self.dados['GRUPO'] == grupo_selecionado]['BASE'].unique()
+                        bases_filtradas = opcoes['bases_por_grupo'].get(grupo_selecionado, [])
                     else:
-                        bases_filtradas = self.dados['BASE'].unique()
+                        bases_filtradas = opcoes['bases']
                     
-                    bases_disponiveis = ['Todas'] + sorted(bases_filtradas.tolist())
+                    bases_disponiveis = ['Todas'] + bases_filtradas
                     base_selecionada = st.selectbox(
                         "Selecione a Base:",
                         bases_disponiveis,
@@ -287,61 +782,37 @@ class DashboardTecnicos:
             # Filtro de STATUS
             with col2:
                 if 'STATUS' in self.dados.columns:
-                    status_disponiveis = sorted(self.dados['STATUS'].dropna().unique().tolist())
+                    status_disponiveis = opcoes['status']
                     status_selecionados = st.multiselect(
                         "Selecione os Status:",
                         status_disponiveis,
                         default=status_disponiveis
                     )
             
-            # Aplica os filtros
-            # 1. Filtro de período
-            mask_periodo = (self.dados['DATA_TOA'] >= data_min) & \
-                          (self.dados['DATA_TOA'] <= data_max)
-            
-            # 2. Filtro de GRUPO e BASE
-            if grupo_selecionado != 'Todos':
-                mask_grupo = (self.dados['GRUPO'] == grupo_selecionado)
-            else:
-                mask_grupo = pd.Series(True, index=self.dados.index)
-            
-            if base_selecionada != 'Todas':
-                mask_base = (self.dados['BASE'] == base_selecionada)
-            else:
-                mask_base = pd.Series(True, index=self.dados.index)
-            
-            # 3. Filtro de STATUS
-            if status_selecionados:
-                mask_status = self.dados['STATUS'].isin(status_selecionados)
-            else:
+            if not status_selecionados:
                 st.warning("Por favor, selecione pelo menos um status")
                 return
             
-            # Aplica todos os filtros
-            dados_filtrados = self.dados[mask_periodo & mask_grupo & mask_base & mask_status]
-            
-            # Remove bases com valores zerados
-            dados_agrupados = dados_filtrados.groupby('BASE', observed=True).agg({
-                'CONTRATO': 'count',
-                'VALOR EMPRESA': 'sum'
-            }).reset_index()
-            
-            bases_ativas = dados_agrupados[
-                (dados_agrupados['CONTRATO'] > 0) | 
-                (dados_agrupados['VALOR EMPRESA'] > 0)
-            ]['BASE'].unique()
-            
-            dados_filtrados = dados_filtrados[dados_filtrados['BASE'].isin(bases_ativas)]
+            # Filtros e agregações em cache por (arquivo, grupo, base, status)
+            visoes = self.calcular_visoes_produtividade(
+                self.dados, self.cached_file, self.mtime,
+                grupo_selecionado, base_selecionada, tuple(status_selecionados)
+            )
             
-            if len(dados_filtrados) == 0:
+            if visoes is None:
                 st.warning("Nenhum dado encontrado para os filtros selecionados")
                 return
             
+            graficos = self.montar_graficos_produtividade(
+                visoes, self.cached_file, self.mtime,
+                grupo_selecionado, base_selecionada, tuple(status_selecionados)
+            )
+            
             # Adiciona métricas dinâmicas
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_registros = len(dados_filtrados)
+                total_registros = visoes['total_registros']
                 st.metric(
                     "Total de Registros",
                     f"{total_registros:,}",
@@ -349,15 +820,19 @@ class DashboardTecnicos:
                 )
             
             with col2:
-                total_tecnicos = dados_filtrados['TECNICO'].nunique()
+                total_tecnicos = visoes['total_tecnicos']
                 st.metric(
                     "Total de Técnicos",
                     f"{total_tecnicos:,}",
                     help="Número de técnicos únicos"
                 )
             
+            metricas_base = visoes['metricas_base']
+            total_valor_tecnico = metricas_base['Valor Técnicos'].sum()
+            total_valor_empresa = metricas_base['Valor Empresa'].sum()
+            
             with col3:
-                valor_total = dados_filtrados['VALOR EMPRESA'].sum()
+                valor_total = total_valor_empresa
                 st.metric(
                     "Valor Total",
                     f"R$ {valor_total:,.2f}",
@@ -383,24 +858,13 @@ class DashboardTecnicos:
             
             # Adiciona métricas por base
             st.write("### Métricas por Base")
-            metricas_base = dados_filtrados.groupby('BASE', observed=True).agg({
-                'TECNICO': 'nunique',
-                'CONTRATO': 'nunique',
-                'VALOR TÉCNICO': 'sum',
-                'VALOR EMPRESA': 'sum'
-            }).reset_index()
-            
-            metricas_base.columns = ['Base', 'Total Técnicos', 'Total Contratos', 'Valor Técnicos', 'Valor Empresa']
-            st.dataframe(metricas_base.style.format({
+            st.dataframe(metricas_base.rename_axis('Base').reset_index().style.format({
                 'Valor Técnicos': 'R$ {:,.2f}',
                 'Valor Empresa': 'R$ {:,.2f}'
             }))
             
-            # Métricas gerais
-            total_tecnicos = dados_filtrados['TECNICO'].nunique()
-            total_contratos = dados_filtrados['CONTRATO'].nunique()
-            total_valor_tecnico = dados_filtrados['VALOR TÉCNICO'].sum()
-            total_valor_empresa = dados_filtrados['VALOR EMPRESA'].sum()
+            # Métricas gerais (técnicos já contados acima; valores vêm da agregação por base)
+            total_contratos = visoes['total_contratos']
             
             # Cards com métricas
             col1, col2, col3, col4 = st.columns(4)
@@ -415,110 +879,13 @@ class DashboardTecnicos:
             
             # Produtividade por técnico
             if base_selecionada != 'Todas':
-                # Filtra apenas os técnicos da base selecionada
-                tecnicos_da_base = dados_filtrados[dados_filtrados['BASE'] == base_selecionada]
-                
-                # Verifica se há dados para a base selecionada
-                if len(tecnicos_da_base) == 0:
-                    st.warning(f"Nenhum dado encontrado para a base {base_selecionada}")
-                    return
-                
-                # Agrupa por técnico apenas os dados da base selecionada
-                prod_tecnico = (tecnicos_da_base
-                    .groupby('TECNICO', observed=True)
-                    .agg({
-                        'CONTRATO': 'nunique',
-                        'VALOR TÉCNICO': 'sum',
-                        'VALOR EMPRESA': 'sum'
-                    })
-                    .reset_index()
-                    .sort_values('CONTRATO', ascending=False)  # Ordena por contratos
-                )
-                
-                prod_tecnico.columns = ['Técnico', 'Contratos', 'Valor Técnico', 'Valor Empresa']
-                
-                # Gráfico de contratos por técnico
+                # Gráfico de contratos por técnico (figuras montadas no cache)
                 st.write(f"### Contratos por Técnico - {base_selecionada}")
-                
-                # Remove técnicos com 0 contratos
-                prod_tecnico = prod_tecnico[prod_tecnico['Contratos'] > 0]
-                
-                fig = px.bar(prod_tecnico, 
-                           x='Contratos',
-                           y='Técnico',
-                           title=f'Contratos Executados por Técnico - {base_selecionada}',
-                           height=max(600, len(prod_tecnico) * 25),  # Altura dinâmica
-                           orientation='h'  # Barras horizontais
-                )
-                
-                fig.update_layout(
-                    showlegend=False,
-                    xaxis_title="Quantidade de Contratos",
-                    yaxis_title="Técnico",
-                    yaxis={'categoryorder':'total descending'},  # Ordena do maior para o menor
-                    margin=dict(l=250, r=50)  # Margem para nomes longos
-                )
-                
-                # Adiciona rótulos nas barras
-                fig.update_traces(
-                    texttemplate='%{x}',
-                    textposition='outside',
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(pio.from_json(graficos['tecnicos']), use_container_width=True)
             
             # Análise por tipo de serviço
             st.write("### Análise por Tipo de Serviço")
-            
-            # Se uma base específica foi selecionada, mostra apenas dados dela
-            if base_selecionada != 'Todas':
-                servicos_analise = dados_filtrados.groupby([
-                    'TIPO DE SERVIÇO'
-                ], observed=True)['CONTRATO'].nunique().reset_index()
-                
-                # Ordena por quantidade de contratos
-                servicos_analise = servicos_analise.sort_values('CONTRATO', ascending=False)
-                
-                fig = px.bar(servicos_analise, 
-                            x='CONTRATO',
-                            y='TIPO DE SERVIÇO',
-                            title=f'Contratos por Tipo de Serviço - {base_selecionada}',
-                            height=max(400, len(servicos_analise) * 30),
-                            orientation='h')
-            else:
-                # Se "Todas" as bases, mantém a visualização por base
-                servicos_analise = dados_filtrados.groupby([
-                    'BASE',
-                    'TIPO DE SERVIÇO'
-                ], observed=True)['CONTRATO'].nunique().reset_index()
-                
-                # Ordena por quantidade de contratos
-                servicos_analise = servicos_analise.sort_values(['BASE', 'CONTRATO'], ascending=[True, False])
-                
-                fig = px.bar(servicos_analise, 
-                            y='BASE',
-                            x='CONTRATO',
-                            color='TIPO DE SERVIÇO',
-                            title='Contratos por Tipo de Serviço e Base',
-                            height=max(400, len(servicos_analise['BASE'].unique()) * 50),
-                            barmode='group')
-            
-            fig.update_layout(
-                showlegend=True,
-                xaxis_title="Quantidade de Contratos",
-                yaxis_title="Tipo de Serviço" if base_selecionada != 'Todas' else "Base",
-                yaxis={'categoryorder':'total ascending'},
-                legend_title="Tipo de Serviço"
-            )
-            
-            # Adiciona rótulos nas barras se for base específica
-            if base_selecionada != 'Todas':
-                fig.update_traces(
-                    texttemplate='%{x}',
-                    textposition='outside',
-                )
-            
-            st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(pio.from_json(graficos['servicos']), use_container_width=True)
             
             # Valores por Base
             st.write("### Valores")
@@ -527,32 +894,12 @@ class DashboardTecnicos:
                 # Para base específica, mostra apenas o total
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Valor Total Técnicos", f"R$ {dados_filtrados['VALOR TÉCNICO'].sum():,.2f}")
+                    st.metric("Valor Total Técnicos", f"R$ {total_valor_tecnico:,.2f}")
                 with col2:
-                    st.metric("Valor Total Empresa", f"R$ {dados_filtrados['VALOR EMPRESA'].sum():,.2f}")
+                    st.metric("Valor Total Empresa", f"R$ {total_valor_empresa:,.2f}")
             else:
                 # Para todas as bases, mostra o gráfico por base
-                valores_base = dados_filtrados.groupby('BASE', observed=True).agg({
-                    'VALOR TÉCNICO': 'sum',
-                    'VALOR EMPRESA': 'sum'
-                }).reset_index()
-                
-                fig = px.bar(valores_base,
-                           y='BASE',
-                           x=['VALOR TÉCNICO', 'VALOR EMPRESA'],
-                           title='Valores por Base',
-                           height=max(400, len(valores_base) * 50),
-                           barmode='group')
-                
-                fig.update_layout(
-                    showlegend=True,
-                    xaxis_title="Valor (R$)",
-                    yaxis_title="Base",
-                    yaxis={'categoryorder':'total ascending'},
-                    xaxis=dict(tickformat="R$ ,.2f")
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(pio.from_json(graficos['valores']), use_container_width=True)
 
         except Exception as e:
             st.error(f"Erro na análise: {str(e)}")
@@ -560,9 +907,13 @@ class DashboardTecnicos:
             st.write("Colunas disponíveis:", list(self.dados.columns))
             st.write("Amostra da coluna de valor:", self.dados['VALOR TÉCNICO'].head())
 
-    def mostrar_tabela_bases(self, dados_filtrados, grupo_selecionado='Todos'):
+    def mostrar_tabela_bases(self, dados_filtrados, grupo_selecionado='Todos', agregado_base=None):
         """
         Mostra os dados em formato de tabela similar ao Excel
+        
+        `agregado_base` (CONTRATO, TECNICO e VALOR EMPRESA por BASE de
+        `dados_filtrados`), quando já calculado por quem chama, é reaproveitado
+        no lugar de agrupar todas as linhas novamente
         """
         try:
             # Verifica se há dados
@@ -570,16 +921,32 @@ class DashboardTecnicos:
                 st.warning("Não há dados para gerar as tabelas com os filtros atuais")
                 return
 
-            # Filtra por grupo se necessário
+            # Filtra por grupo se necessário (a agregação recebida deixa de valer)
             if grupo_selecionado != 'Todos':
-                dados_filtrados = dados_filtrados[dados_filtrados['GRUPO'] == grupo_selecionado]
+                dados_filtrados = dados_filtrados[filtro_categoria(dados_filtrados['GRUPO'], grupo_selecionado)]
+                agregado_base = None
+
+            def agregar(dados):
+                return dados.groupby('BASE', observed=True).agg(
+                    **{'VALOR EMPRESA': ('VALOR EMPRESA', 'sum')},
+                    CONTRATO=('CONTRATO', 'count'),
+                    TECNICO=('TECNICO', 'nunique')
+                )
+
+            if agregado_base is None:
+                agregado_base = agregar(dados_filtrados)
+            else:
+                # Mesmo tipo da coluna original (float32), como no groupby
+                agregado_base = agregado_base.astype({'VALOR EMPRESA': dados_filtrados['VALOR EMPRESA'].dtype})
 
+            # Serviços de desconexão (avaliado nas categorias, não por linha)
+            if 'TIPO DE SERVIÇO' in dados_filtrados.columns:
+                eh_desconexao = filtro_desconexao(dados_filtrados['TIPO DE SERVIÇO'])
+            else:
+                eh_desconexao = np.zeros(len(dados_filtrados), dtype=bool)
+            
             # Remove bases com valores zerados
-            dados_agrupados = dados_filtrados.groupby('BASE', observed=True).agg({
-                'VALOR EMPRESA': 'sum',
-                'CONTRATO': 'count',
-                'TECNICO': 'nunique'
-            }).reset_index()
+            dados_agrupados = agregado_base[['VALOR EMPRESA', 'CONTRATO', 'TECNICO']].reset_index()
             
             # Filtra apenas bases com valores ou contratos
             dados_agrupados = dados_agrupados[
@@ -593,17 +960,8 @@ class DashboardTecnicos:
                 st.warning("Não há dados ativos para gerar as tabelas")
                 return
 
-            # Calcula VL EQ (Valor por Equipe)
-            dados_agrupados['VL EQ'] = dados_agrupados.apply(
-                lambda x: round(x['VALOR EMPRESA'] / x['TECNICO'], 2) if x['TECNICO'] > 0 else 0, 
-                axis=1
-            )
-            
-            # Calcula EQ_CTTS (Contratos por Equipe)
-            dados_agrupados['EQ_CTTS'] = dados_agrupados.apply(
-                lambda x: round(x['CONTRATO'] / x['TECNICO'], 1) if x['TECNICO'] > 0 else 0,
-                axis=1
-            )
+            # Calcula VL EQ (Valor por Equipe) e EQ_CTTS (Contratos por Equipe)
+            dados_agrupados = adicionar_metricas_equipe(dados_agrupados)
 
             # Renomeia as colunas
             dados_agrupados.columns = ['BASE', 'VALOR', 'CONTRATOS', 'EQUIPES', 'VL EQ', 'EQ_CTTS']
@@ -612,17 +970,7 @@ class DashboardTecnicos:
             dados_agrupados = dados_agrupados.sort_values('BASE')
 
             # Adiciona linha de total
-            total = pd.DataFrame({
-                'BASE': ['Total Geral'],
-                'VALOR': [dados_agrupados['VALOR'].sum()],
-                'CONTRATOS': [dados_agrupados['CONTRATOS'].sum()],
-                'EQUIPES': [dados_agrupados['EQUIPES'].sum()],
-                'VL EQ': [round(dados_agrupados['VALOR'].sum() / dados_agrupados['EQUIPES'].sum(), 2) if dados_agrupados['EQUIPES'].sum() > 0 else 0],
-                'EQ_CTTS': [round(dados_agrupados['CONTRATOS'].sum() / dados_agrupados['EQUIPES'].sum(), 1) if dados_agrupados['EQUIPES'].sum() > 0 else 0]
-            })
-
-            # Concatena e reseta o índice
-            dados_agrupados = pd.concat([dados_agrupados, total], ignore_index=True)
+            dados_agrupados = adicionar_total_geral(dados_agrupados)
 
             # Formata a tabela
             st.write("### Resumo por Base")
@@ -648,16 +996,9 @@ class DashboardTecnicos:
 
             # Mesma lógica para a tabela de desconexão
             if 'TIPO DE SERVIÇO' in dados_filtrados.columns:
-                desconexao = dados_filtrados[
-                    dados_filtrados['TIPO DE SERVIÇO'].str.contains('DESCONEX', case=False, na=False)
-                ]
-
-                if len(desconexao) > 0:
-                    desconexao = desconexao.groupby('BASE').agg({
-                        'VALOR EMPRESA': 'sum',
-                        'CONTRATO': 'count',
-                        'TECNICO': 'nunique'
-                    }).reset_index()
+                if eh_desconexao.any():
+                    # Agrupa só as linhas de desconexão
+                    desconexao = agregar(dados_filtrados[eh_desconexao]).reset_index()
 
                     # Filtra apenas bases com valores ou contratos
                     desconexao = desconexao[
@@ -668,26 +1009,10 @@ class DashboardTecnicos:
 
                     if len(desconexao) > 0:
                         # Calcula métricas adicionais
-                        desconexao['VL EQ'] = desconexao.apply(
-                            lambda x: round(x['VALOR EMPRESA'] / x['TECNICO'], 2) if x['TECNICO'] > 0 else 0,
-                            axis=1
-                        )
-                        desconexao['EQ_CTTS'] = desconexao.apply(
-                            lambda x: round(x['CONTRATO'] / x['TECNICO'], 1) if x['TECNICO'] > 0 else 0,
-                            axis=1
-                        )
+                        desconexao = adicionar_metricas_equipe(desconexao)
 
                         # Adiciona total
-                        total_desc = pd.DataFrame({
-                            'BASE': ['Total Geral'],
-                            'VALOR EMPRESA': [desconexao['VALOR EMPRESA'].sum()],
-                            'CONTRATO': [desconexao['CONTRATO'].sum()],
-                            'TECNICO': [desconexao['TECNICO'].sum()],
-                            'VL EQ': [round(desconexao['VALOR EMPRESA'].sum() / desconexao['TECNICO'].sum(), 2) if desconexao['TECNICO'].sum() > 0 else 0],
-                            'EQ_CTTS': [round(desconexao['CONTRATO'].sum() / desconexao['TECNICO'].sum(), 1) if desconexao['TECNICO'].sum() > 0 else 0]
-                        })
-
-                        desconexao = pd.concat([desconexao, total_desc], ignore_index=True)
+                        desconexao = adicionar_total_geral(desconexao)
 
                         st.write("### Desconexão")
                         st.dataframe(
@@ -724,42 +1049,34 @@ class DashboardTecnicos:
         if self.dados is not None:
             try:
                 # Verifica se há datas válidas
-                datas_validas = self.dados['DATA_TOA'].dropna()
-                if len(datas_validas) == 0:
+                if self.dados['DATA_TOA'].isna().all():
                     st.error("Não foi possível processar as datas no arquivo")
                     return
                 
-                data_min = datas_validas.min()
-                data_max = datas_validas.max()
-                
                 # Filtros
                 st.write("### Filtros")
                 col1, col2 = st.columns(2)
                 
                 # Filtro de BASE
                 with col1:
-                    bases_disponiveis = ['Todas'] + sorted(
-                        self.dados['BASE']
-                        .replace('', 'Não Informado')
-                        .unique()
-                        .tolist()
-                    )
+                    # Lista pré-calculada no carregamento (vazios já viram 'Não Informado')
+                    bases_disponiveis = ['Todas'] + self.opcoes_filtro['bases']
                     base_selecionada = st.selectbox(
                         "Selecione a Base:",
                         bases_disponiveis,
                         key='base_selector_status'
                     )
                 
-                # Aplica filtros
-                if base_selecionada != 'Todas':
-                    dados_filtrados = self.dados[self.dados['BASE'] == base_selecionada]
-                else:
-                    dados_filtrados = self.dados
+                # Filtro e agregações em cache por (arquivo, base)
+                resumo_status, status_temporal = self.calcular_visoes_status(
+                    self.dados, self.cached_file, self.mtime, base_selecionada
+                )
                 
                 # Análise de Status
-                status_count = dados_filtrados.groupby('STATUS', observed=True)['CONTRATO'].nunique().reset_index()
-                status_count.columns = ['Status', 'Quantidade']
-                status_count = status_count.sort_values('Quantidade', ascending=True)
+                status_count = (resumo_status[['Status', 'Quantidade de Contratos']]
+                    .rename(columns={'Quantidade de Contratos': 'Quantidade'})
+                    .sort_values('Quantidade', ascending=True)
+                )
                 
                 # Gráfico de Status
                 fig = px.bar(status_count,
@@ -784,34 +1101,24 @@ class DashboardTecnicos:
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Análise temporal de status
-                status_temporal = dados_filtrados.groupby([
-                    dados_filtrados['DATA_TOA'].dt.date,
-                    'STATUS'
-                ], observed=True)['CONTRATO'].nunique().reset_index()
-                
                 fig = px.line(status_temporal,
                             x='DATA_TOA',
                             y='CONTRATO',
                             color='STATUS',
+                            render_mode='webgl',  # scattergl: desenha no canvas, não em SVG
                             title=f'Evolução dos Status ao Longo do Tempo{" - " + base_selecionada if base_selecionada != "Todas" else ""}')
                 
                 fig.update_layout(
                     xaxis_title="Data",
                     yaxis_title="Quantidade de Contratos",
-                    height=500
+                    height=500,
+                    uirevision='status_temporal'  # Mantém zoom e legenda entre reruns
                 )
                 
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # Tabela resumo
                 st.write("### Resumo por Status")
-                resumo_status = dados_filtrados.groupby('STATUS', observed=True).agg({
-                    'CONTRATO': 'nunique',
-                    'VALOR TÉCNICO': 'sum',
-                    'VALOR EMPRESA': 'sum'
-                }).reset_index()
-                
-                resumo_status.columns = ['Status', 'Quantidade de Contratos', 'Valor Técnico', 'Valor Empresa']
                 st.dataframe(resumo_status.style.format({
                     'Valor Técnico': 'R$ {:,.2f}',
                     'Valor Empresa': 'R$ {:,.2f}'
@@ -824,34 +1131,45 @@ def load_css():
     with open('style.css') as f:
         st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
 
-def analisar_clusters_tecnicos(dados):
+@st.cache_data(show_spinner=False, max_entries=3)
+def calcular_clusters_tecnicos(_dados, nome_arquivo, mtime, n_clusters=3):
+    """Métricas por técnico + K-means, calculados uma vez por arquivo (chave: nome + mtime)"""
+    # scikit-learn importado só aqui: as páginas que importam este módulo não pagam o custo
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import MiniBatchKMeans
+    
+    # Prepara dados dos técnicos
+    metricas_tecnicos = _dados.groupby('TECNICO', observed=True).agg(
+        CONTRATO=('CONTRATO', 'count'),
+        **{'VALOR EMPRESA': ('VALOR EMPRESA', 'mean')},
+        TEMPO_MINUTOS=('TEMPO_MINUTOS', 'mean'),
+        STATUS=('EXECUTADO', 'mean')  # média booleana: caminho Cython, sem lambda
+    ).reset_index()
+    metricas_tecnicos['STATUS'] *= 100
+    
+    # Seleciona features para clustering
+    features = ['CONTRATO', 'VALOR EMPRESA', 'TEMPO_MINUTOS', 'STATUS']
+    X = metricas_tecnicos[features].to_numpy(dtype=np.float32)  # StandardScaler e K-means mantêm float32
+    
+    # Normaliza dados
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    
+    # K-means mini-batch: aproximação do K-means completo, mais rápida
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=256, n_init=5, random_state=42)
+    clusters = kmeans.fit_predict(X_scaled)
+    
+    # Adiciona clusters ao dataframe
+    metricas_tecnicos['CLUSTER'] = clusters
+    return metricas_tecnicos
+
+def analisar_clusters_tecnicos(dados, nome_arquivo=None, mtime=None):
     """Agrupa técnicos em clusters por performance"""
     st.subheader("🎯 Análise de Clusters de Performance")
     
     try:
-        # Prepara dados dos técnicos
-        metricas_tecnicos = dados.groupby('TECNICO', observed=True).agg({
-            'CONTRATO': 'count',
-            'VALOR EMPRESA': 'mean',
-            'TEMPO_MINUTOS': 'mean',
-            'STATUS': lambda x: (x == 'Executado').mean() * 100
-        }).reset_index()
-        
-        # Seleciona features para clustering
-        features = ['CONTRATO', 'VALOR EMPRESA', 'TEMPO_MINUTOS', 'STATUS']
-        X = metricas_tecnicos[features].values
-        
-        # Normaliza dados
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Aplica K-means com número ideal de clusters
         n_clusters = 3  # Pode ser ajustado baseado no elbow plot
-        kmeans = KMeans(n_clusters=n_clusters)
-        clusters = kmeans.fit_predict(X_scaled)
-        
-        # Adiciona clusters ao dataframe
-        metricas_tecnicos['CLUSTER'] = clusters
+        metricas_tecnicos = calcular_clusters_tecnicos(dados, nome_arquivo, mtime, n_clusters)
         
         # Visualizações
         col1, col2 = st.columns(2)
@@ -870,20 +1188,22 @@ def analisar_clusters_tecnicos(dados):
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
-            # Características dos clusters
-            for i in range(n_clusters):
+            # Características dos clusters (um único groupby para todos)
+            resumo_clusters = metricas_tecnicos.groupby('CLUSTER').agg(
+                QUANTIDADE=('TECNICO', 'count'),
+                MEDIA_CONTRATOS=('CONTRATO', 'mean'),
+                MEDIA_SUCESSO=('STATUS', 'mean')
+            )
+            for i, quantidade, media_contratos, media_sucesso in resumo_clusters.itertuples(name=None):
                 st.write(f"### Cluster {i}")
-                cluster_data = metricas_tecnicos[metricas_tecnicos['CLUSTER'] == i]
-                
-                st.write(f"Quantidade de técnicos: {len(cluster_data)}")
-                st.write(f"Média de contratos: {cluster_data['CONTRATO'].mean():.1f}")
-                st.write(f"Taxa média de sucesso: {cluster_data['STATUS'].mean():.1f}%")
+                st.write(f"Quantidade de técnicos: {quantidade}")
+                st.write(f"Média de contratos: {media_contratos:.1f}")
+                st.write(f"Taxa média de sucesso: {media_sucesso:.1f}%")
                 
-        # Lista técnicos por cluster
+        # Lista técnicos por cluster (técnicos separados uma vez, sem máscara por cluster)
         st.write("### Detalhamento dos Clusters")
-        for i in range(n_clusters):
+        for i, cluster_data in metricas_tecnicos.groupby('CLUSTER'):
             with st.expander(f"Cluster {i}"):
-                cluster_data = metricas_tecnicos[metricas_tecnicos['CLUSTER'] == i]
                 st.dataframe(cluster_data)
                 
     except Exception as e:
@@ -892,45 +1212,38 @@ def analisar_clusters_tecnicos(dados):
 def preparar_dados(dados):
     """Prepara os dados para análise, criando colunas calculadas"""
     try:
-        dados = dados.copy()
+        dados = dados.copy(deep=False)  # Copy-on-write: colunas novas não alteram o original
         
         # Converte datas
         if 'DATA_TOA' in dados.columns:
             dados['DATA_TOA'] = pd.to_datetime(dados['DATA_TOA'])
         
+        # Chaves de agrupamento como categoria (hash de códigos inteiros)
+        for col in COLUNAS_CATEGORICAS:
+            if col in dados.columns and not isinstance(dados[col].dtype, pd.CategoricalDtype):
+                dados[col] = dados[col].astype('category')
+        
         # Garante que valores monetários sejam numéricos
         for col in ['VALOR TÉCNICO', 'VALOR EMPRESA']:
             if col in dados.columns:
-                dados[col] = pd.to_numeric(
-                    dados[col].astype(str)
-                    .str.replace('R$', '')
-                    .str.replace('.', '')
-                    .str.replace(',', '.'),
-                    errors='coerce'
-                )
+                if pd.api.types.is_numeric_dtype(dados[col]):
+                    # Já convertido no carregamento: não reprocessa como texto
+                    dados[col] = dados[col].astype('float32')
+                else:
+                    dados[col] = converter_valor_monetario(dados[col])
         
         # Calcula métricas adicionais
         if 'TEMPO_MINUTOS' not in dados.columns:
-            # Calcula tempo médio por tipo de serviço
-            tempo_medio_servico = {
-                'ADESAO DE ASSINATURA': 90,
-                'MUDANCA DE ENDERECO': 120,
-                'VISITA TECNICA': 60,
-                'SERVICOS': 45,
-                'MUDANCA DE PACOTE': 30
-            }
-            
             # Aplica tempo médio baseado no tipo de serviço
-            dados['TEMPO_MINUTOS'] = dados['TIPO DE SERVIÇO'].map(
-                lambda x: tempo_medio_servico.get(x, 60)
-            )
+            dados['TEMPO_MINUTOS'] = estimar_tempo_minutos(dados['TIPO DE SERVIÇO'])
             
             st.info("Usando tempos médios estimados por tipo de serviço")
         
         # Adiciona outras métricas úteis
+        dados['EXECUTADO'] = (dados['STATUS'] == 'Executado').to_numpy()  # bool, 1 byte por linha
         dados['VALOR_POR_MINUTO'] = dados['VALOR EMPRESA'] / dados['TEMPO_MINUTOS']
-        dados['MES'] = dados['DATA_TOA'].dt.month
-        dados['DIA_SEMANA'] = dados['DATA_TOA'].dt.day_name()
+        dados['MES'] = dados['DATA_TOA'].dt.month.astype('int8')
+        dados['DIA_SEMANA_IDX'] = dados['DATA_TOA'].dt.dayofweek.astype('int8')  # 0 = segunda
         
         return dados
     
@@ -939,6 +1252,11 @@ def preparar_dados(dados):
         st.error(f"Colunas disponíveis: {', '.join(dados.columns)}")
         raise e
 
+@st.cache_data(show_spinner=False, max_entries=3)
+def preparar_dados_principal(_dados, nome_arquivo, mtime):
+    """Prepara os dados do painel principal uma única vez por arquivo (chave: nome + mtime)"""
+    return preparar_dados(_dados)
+
 def main():
     st.set_page_config(
         page_title="Dashboard de Produtividade",
@@ -986,10 +1304,10 @@ def main():
             if dashboard.carregar_dados(arquivo):
                 try:
                     # Carrega e prepara os dados
-                    dados = preparar_dados(dashboard.dados)
+                    dados = preparar_dados_principal(dashboard.dados, arquivo, dashboard.mtime)
                     
                     # Chame a função de análise de clusters aqui
-                    analisar_clusters_tecnicos(dados)
+                    analisar_clusters_tecnicos(dados, arquivo, dashboard.mtime)
                     
                     if selected == "Produtividade dos Técnicos":
                         st.title("Dashboard de Produtividade - Técnicos")
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit_app import _ler_parquet, _reduzir_tipos, _salvar_parquet
+
+# Acima de 2**24 o float32 não representa todos os inteiros
+CONTRATO_GRANDE = 2**24 + 1
+
+
+def _dados():
+    return pd.DataFrame({
+        'CONTRATO': [float(CONTRATO_GRANDE), np.nan, 123456789.0],
+        'VALOR EMPRESA': [10.5, 20.25, np.nan],
+    })
+
+
+def test_identificador_acima_de_2_24_nao_perde_precisao():
+    df = _reduzir_tipos(_dados())
+
+    assert df['CONTRATO'].dtype == np.float64
+    pd.testing.assert_series_equal(df['CONTRATO'], _dados()['CONTRATO'])
+
+
+def test_colunas_de_medida_vao_para_float32():
+    df = _reduzir_tipos(_dados())
+
+    assert df['VALOR EMPRESA'].dtype == np.float32
+
+
+def test_identificador_sobrevive_a_copia_parquet(tmp_path):
+    caminho = str(tmp_path / '.cache' / 'planilha.xlsx.parquet')
+    colunas = ['CONTRATO', 'VALOR EMPRESA']
+
+    _salvar_parquet(_reduzir_tipos(_dados()), caminho, colunas)
+    df = _ler_parquet(caminho, colunas)
+
+    pd.testing.assert_series_equal(df['CONTRATO'], _dados()['CONTRATO'])